@@ -1,17 +1,222 @@
-from flask import Flask, render_template, request, jsonify
-import pandas as pd
-import joblib
+import json
 import os
-from models.model_utils import preprocess_data
+import threading
+import time
+from flask import Flask, render_template, request, jsonify, Response
+from models.micro_batch import MicroBatcher
+from models.metrics import MetricsRegistry, RequestTimer
+from models.logging_utils import configure_logging
+from models.registry import ModelRegistry
+from models.prediction_cache import PredictionCache, record_key
+
+# Only Flask and standard-library-backed modules are imported here. NumPy, pandas and
+# scikit-learn (through models.model_utils) are imported by the functions that use
+# them, and warm_up() loads them with the model, so importing the app is fast and
+# /ready can answer while a new worker warms up.
 
 app = Flask(__name__)
 
-# Load the dataset
-try:
-    df = pd.read_csv('adult.csv')
-    print(f"Dataset loaded successfully with {len(df)} records")
-except Exception as e:
-    print(f"Error loading dataset: {str(e)}")
+# LOG_LEVEL=WARNING switches per-request logging off; LOG_SAMPLE_RATE keeps only a
+# fraction of the routine (DEBUG/INFO) lines
+logger = configure_logging('income_app',
+                           level=os.environ.get('LOG_LEVEL', 'INFO'),
+                           sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', 1.0)))
+# The models package logs under its module names (model reloads, cache rebuilds)
+configure_logging('models',
+                  level=os.environ.get('LOG_LEVEL', 'INFO'),
+                  sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', 1.0)))
+
+# Per-worker request metrics, served at /metrics
+metrics_registry = MetricsRegistry()
+predict_requests = metrics_registry.counter(
+    'predict_requests_total', "Requests to /predict by outcome", ['outcome'])
+predict_request_seconds = metrics_registry.histogram(
+    'predict_request_seconds', "Time to answer a /predict request", ['outcome'])
+predict_stage_seconds = metrics_registry.histogram(
+    'predict_stage_seconds', "Time spent in each stage of a /predict request", ['stage'])
+
+# Load the model once per worker process; it is reloaded when the file changes.
+# MODEL_FORMAT=arrays serves the memory-mapped forest export instead of the pickle,
+# and MODEL_FORMAT=compact its pruned, float32 variant.
+MODEL_PATH = 'models/income_predictor.pkl'
+FOREST_META_PATH = 'models/income_predictor_forest/meta.json'
+COMPACT_META_PATH = 'models/income_predictor_compact/meta.json'
+MODEL_FORMAT = os.environ.get('MODEL_FORMAT', 'pickle')
+
+def load_forest(meta_path):
+    from models.forest_export import load_array_forest
+    return load_array_forest(meta_path)
+
+def load_model_tables(model):
+    """Category extensions, columnar preprocessing and the calibration table.
+
+    They belong to the model they were saved with, so they are loaded with it and
+    carried on its LoadedModel: a request that got the new model also gets its tables.
+    """
+    from models.calibration import CalibrationTable
+    from models.frame_utils import FramePreprocessor
+    from models.incremental import CategoryExtensions
+    extensions = CategoryExtensions.load()
+    return {
+        'extensions': extensions,
+        'preprocessor': FramePreprocessor(extensions=extensions),
+        'calibration': CalibrationTable.load(),
+    }
+
+if MODEL_FORMAT == 'arrays':
+    model_registry = ModelRegistry(FOREST_META_PATH, loader=load_forest,
+                                   load_companions=load_model_tables)
+elif MODEL_FORMAT == 'compact':
+    model_registry = ModelRegistry(COMPACT_META_PATH, loader=load_forest,
+                                   load_companions=load_model_tables)
+else:
+    model_registry = ModelRegistry(MODEL_PATH, load_companions=load_model_tables)
+
+# drift_monitor tracks input drift against the training data over a rolling window;
+# warm_up() starts it
+drift_monitor = None
+
+def reset_drift_reference(loaded_model):
+    from models.drift import load_reference
+    if drift_monitor is not None:
+        drift_monitor.set_reference(load_reference())
+
+model_registry.on_reload(reset_drift_reference)
+
+# Cache of single-record predictions, emptied whenever a new model is loaded
+prediction_cache = PredictionCache(
+    maxsize=int(os.environ.get('PREDICTION_CACHE_SIZE', 4096)),
+    ttl=float(os.environ.get('PREDICTION_CACHE_TTL', 300)))
+model_registry.on_reload(prediction_cache.clear)
+
+BATCH_CHUNK_SIZE = 5000
+
+# Decision-path explainer for the current model, loaded on the first ?explain=1
+_explainer = {'version': None, 'forest': None}
+_explainer_lock = threading.Lock()
+
+def get_explainer(loaded_model):
+    from models.explanations import load_explainer
+    # Requests for the old and the new model can overlap during a reload
+    with _explainer_lock:
+        if _explainer['version'] != loaded_model.version:
+            _explainer['forest'] = load_explainer(loaded_model.model, loaded_model.sha256,
+                                                  os.path.dirname(FOREST_META_PATH))
+            _explainer['version'] = loaded_model.version
+        return _explainer['forest']
+
+def wants_explanation():
+    return request.args.get('explain', '').lower() in ('1', 'true', 'yes')
+
+EXPLANATION_UNAVAILABLE = "Explanations need the forest export that matches this model; re-run train_model.py"
+
+def score_predict_requests(items):
+    """Score the (loaded model, record) pairs of concurrent /predict requests together.
+
+    Returns (prediction, note, probability of >50K) per record, or None where the
+    record needs the single-record path, which reports its error exactly as before.
+    """
+    import pandas as pd
+    from models.input_utils import validate_frame
+    from models.scoring import score_frame, override_note
+    results = [None] * len(items)
+    groups = {}
+    for i, (loaded_model, data) in enumerate(items):
+        groups.setdefault(loaded_model.version, (loaded_model, []))[1].append(i)
+    for loaded_model, rows in groups.values():
+        frame = pd.DataFrame([items[i][1] for i in rows])
+        errors = validate_frame(frame)
+        predictions, probabilities, errors, overrides = score_frame(
+            loaded_model.model, loaded_model.companions['preprocessor'], frame, errors)
+        for j, i in enumerate(rows):
+            if errors[j] is None:
+                results[i] = (int(predictions[j]), override_note(overrides[j]),
+                              float(probabilities[j]))
+    return results
+
+# Concurrent /predict cache misses arriving within PREDICT_MAX_WAIT_MS are scored in
+# one predict_proba call; PREDICT_MAX_BATCH=1 scores every request on its own
+predict_batcher = MicroBatcher(
+    score_predict_requests,
+    max_batch_size=int(os.environ.get('PREDICT_MAX_BATCH', 32)),
+    max_wait=float(os.environ.get('PREDICT_MAX_WAIT_MS', 2)) / 1000)
+
+# Dataset aggregates come from a cached summary rather than the raw CSV
+DATASET_PATH = 'adult.csv'
+_stats_cache = {'stat': None, 'payload': None}
+_cube_cache = {'stat': None, 'cube': None}
+
+# A typical profile scored once by warm_up() to exercise the whole prediction path
+WARM_UP_RECORD = {
+    'age': 40, 'workclass': 'Private', 'fnlwgt': 200000, 'education': 'Bachelors',
+    'occupation': 'Exec-managerial', 'gender': 'Male', 'capital-gain': 0,
+    'capital-loss': 0, 'hours-per-week': 40, 'native-country': 'United-States',
+}
+
+# Requests to these endpoints never wait for warm_up()
+COLD_ENDPOINTS = {'ready', 'metrics', 'static', 'home', 'analysis'}
+
+_warm = {'ready': False, 'started': None, 'seconds': None, 'error': None}
+_warm_lock = threading.Lock()
+
+def warm_up():
+    """Make this process ready to predict; later calls return at once.
+
+    Imports the model stack, loads the model with its preprocessing, calibration
+    and drift reference tables, and scores WARM_UP_RECORD so the first real request
+    doesn't pay for first-call setup. Concurrent callers wait for the first one.
+    """
+    if _warm['ready']:
+        return
+    with _warm_lock:
+        if _warm['ready']:
+            return
+        global drift_monitor
+        _warm['started'] = _warm['started'] or time.time()
+        start = time.perf_counter()
+        from models.drift import DriftMonitor, load_reference
+        from models.input_utils import fill_defaults
+        drift_monitor = DriftMonitor(load_reference(),
+                                     window_seconds=float(os.environ.get('DRIFT_WINDOW_SECONDS', 3600)),
+                                     buckets=int(os.environ.get('DRIFT_BUCKETS', 12)),
+                                     max_queued_rows=int(os.environ.get('DRIFT_QUEUE_ROWS', 10000)))
+        loaded_model = model_registry.get()
+        # Without a model, requests get rule-based predictions until one is trained
+        if loaded_model is not None:
+            try:
+                score_predict_requests([(loaded_model, fill_defaults(dict(WARM_UP_RECORD)))])
+            except Exception as e:
+                _warm['error'] = str(e)
+                logger.exception("Warm-up prediction failed: %s", str(e))
+        _warm['seconds'] = time.perf_counter() - start
+        _warm['ready'] = True
+        logger.info("Warmed up in %.2fs", _warm['seconds'])
+
+def start_warm_up():
+    """Warm up on a background thread, so /ready answers while the model loads"""
+    _warm['started'] = time.time()
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+@app.before_request
+def wait_until_warm():
+    if request.endpoint not in COLD_ENDPOINTS:
+        warm_up()
+
+@app.route('/ready')
+def ready():
+    """200 once this process has warmed up and can serve predictions, 503 before"""
+    if not _warm['ready']:
+        return jsonify({'ready': False, 'warming': _warm['started'] is not None}), 503
+    loaded_model = model_registry.get()
+    status = {
+        'ready': True,
+        'warm_up_seconds': round(_warm['seconds'], 3),
+        'model_loaded': loaded_model is not None,
+        'model_version': loaded_model.version if loaded_model else None,
+    }
+    if _warm['error']:
+        status['warm_up_error'] = _warm['error']
+    return jsonify(status)
 
 @app.route('/')
 def home():
@@ -23,114 +228,93 @@ def analysis():
 
 @app.route('/predict', methods=['POST'])
 def predict():
+    import numpy as np
+    import pandas as pd
+    from models.explanations import explanation_json, feature_names
+    from models.incremental import preprocess_record
+    from models.input_utils import missing_fields, fill_defaults, validate_frame
+    from models.model_utils import FEATURE_ORDER
+    from models.rules import fallback_rules, override_rules
+    from models.scoring import override_note, SIMULATED_NOTE
+    timer = RequestTimer(predict_stage_seconds)
+    outcome = 'error'
     try:
         # Get data from the form
-        data = request.get_json()
-        print(f"Received data: {data}")
+        with timer.span('parse'):
+            data = request.get_json()
+        logger.debug("Received data: %s", data)
         
         # Check if required fields are present
-        required_fields = ['age', 'workclass', 'fnlwgt', 'education', 'occupation',
-                          'gender', 'capital-gain', 'capital-loss', 
-                          'hours-per-week', 'native-country']
-        
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
+        with timer.span('validate'):
+            missing = missing_fields(data)
+        if missing:
+            outcome = 'invalid'
             return jsonify({
                 'success': False,
-                'error': f"Missing required fields: {', '.join(missing_fields)}"
+                'error': f"Missing required fields: {', '.join(missing)}"
             })
             
         # Add missing fields with default values
-        if 'educational-num' not in data:
-            education_map = {
-                'Preschool': 1, '1st-4th': 2, '5th-6th': 3, '7th-8th': 4,
-                '9th': 5, '10th': 6, '11th': 7, '12th': 8, 'HS-grad': 9,
-                'Some-college': 10, 'Assoc-voc': 11, 'Assoc-acdm': 12,
-                'Bachelors': 13, 'Masters': 14, 'Prof-school': 15, 'Doctorate': 16
-            }
-            data['educational-num'] = education_map.get(data['education'], 0)
-            
-        if 'race' not in data:
-            data['race'] = 'White'  # Default value
-            
-        if 'marital-status' not in data:
-            data['marital-status'] = 'Never-married'  # Default value
+        with timer.span('fill_defaults'):
+            fill_defaults(data)
+        drift_monitor.observe(dict(data))
             
-        if 'relationship' not in data:
-            data['relationship'] = 'Not-in-family'  # Default value
-            
-        # Check if model exists
-        model_path = 'models/income_predictor.pkl'
-        if not os.path.exists(model_path):
+        # Get the warm model, if one has been trained
+        with timer.span('model_lookup'):
+            loaded_model = model_registry.get()
+        if loaded_model is None:
             # Use simulated prediction for testing based on rules
-            print(f"Model file not found: {model_path}, using rule-based prediction")
-            # Logic for determining income based on key factors
-            high_income = False
-            
-            # Simple rules based on the Adult dataset patterns:
-            age = int(data['age'])
-            education = data['education']
-            hours = int(data['hours-per-week'])
-            occupation = data['occupation']
-            capital_gain = int(data['capital-gain'])
-            
-            # Check different profile types
-            # Young person with basic education and service job: Likely <=50K
-            if age < 30 and education in ['HS-grad', 'Some-college', '11th', '12th', '10th', '9th'] and \
-               occupation in ['Other-service', 'Adm-clerical', 'Handlers-cleaners', 'Farming-fishing'] and hours < 40:
-                high_income = False
-                print("Rule applied: Young worker with basic education")
-            # Young person regardless of job with no capital gain: Likely <=50K    
-            elif age < 25 and capital_gain < 1000:
-                high_income = False
-                print("Rule applied: Young worker with no capital gain")
-            # Executive with higher education working long hours: Likely >50K
-            elif age > 35 and education in ['Bachelors', 'Masters', 'Doctorate'] and \
-                 occupation in ['Exec-managerial', 'Prof-specialty'] and hours >= 45:
-                high_income = True
-                print("Rule applied: Executive with higher education")
-            # Capital gain is a strong predictor
-            elif capital_gain > 5000:  # Significant capital gain often indicates >50K
-                high_income = True
-                print("Rule applied: High capital gain")
-            # Default to demographic averages
-            else:
-                # Men over 35 with good education: More likely >50K
-                if data['gender'] == 'Male' and age >= 35 and \
-                   education in ['Bachelors', 'Masters', 'Doctorate', 'Prof-school']:
-                    high_income = True
-                    print("Rule applied: Older male with higher education")
-                else:
-                    high_income = False
-                    print("Rule applied: Default demographic")
-            
+            logger.info("Model file not found: %s, using rule-based prediction", model_registry.path)
+            # The rules treat values that aren't numbers as NaN and would quietly fall
+            # through to the default, so reject them as the model path does
+            with timer.span('validate'):
+                frame = pd.DataFrame([data])
+                error = validate_frame(frame)[0]
+            if error is not None:
+                outcome = 'invalid'
+                return jsonify({'success': False, 'error': error})
+            with timer.span('rules'):
+                rule = fallback_rules.evaluate(frame)[0]
+            outcome = 'simulated'
             return jsonify({
                 'success': True,
-                'prediction': '>50K' if high_income else '<=50K',
-                'note': 'This is a simulated prediction based on demographic rules since the model file is missing'
+                'prediction': '>50K' if fallback_rules.high_income[rule] else '<=50K',
+                'rule': fallback_rules.rule_name(rule),
+                'note': SIMULATED_NOTE
             })
         
-        # Preprocess the input data
-        processed_data = preprocess_data(data)
-        
-        # Load the model
-        model = joblib.load(model_path)
-        
-        # Make prediction
-        prediction = model.predict(processed_data)[0]
-        
-        # Override specific edge cases where the model might be wrong
-        # Young service worker with basic education rule
-        if (int(data['age']) < 30 and 
-            data['education'] in ['HS-grad', 'Some-college', '11th', '12th', '10th', '9th'] and
-            data['occupation'] in ['Other-service', 'Handlers-cleaners', 'Adm-clerical'] and
-            int(data['hours-per-week']) < 40 and
-            int(data['capital-gain']) < 1000):
-            # This profile should almost always be <=50K
-            prediction = 0
-            override_note = "Prediction adjusted based on demographic rules (young worker profile)"
+        # Repeated profiles are answered from the cache
+        with timer.span('cache_lookup'):
+            cache_key = record_key(data, FEATURE_ORDER)
+            cached = prediction_cache.get(loaded_model.version, cache_key)
+        outcome = 'cached' if cached is not None else 'success'
+        processed_data = None
+        if cached is None and predict_batcher.enabled:
+            # Preprocessing, predict and rule overrides for a whole micro-batch
+            with timer.span('micro_batch'):
+                cached = predict_batcher.submit((loaded_model, data))
+            if cached is not None:
+                prediction_cache.put(loaded_model.version, cache_key, cached)
+        if cached is not None:
+            prediction, note, probability = cached
         else:
-            override_note = None
+            # Preprocess the input data
+            with timer.span('preprocess'):
+                processed_data = preprocess_record(data, loaded_model.companions['extensions'])
+            
+            # Make prediction with the shared, already-loaded model
+            with timer.span('predict'):
+                model = loaded_model.model
+                proba = model.predict_proba(processed_data)[0]
+                prediction = model.classes_[np.argmax(proba)]
+                probability = float(proba[list(model.classes_).index(1)])
+            
+            # Override specific edge cases where the model might be wrong
+            with timer.span('rules'):
+                predictions, matched = override_rules.apply(pd.DataFrame([data]), [prediction])
+            prediction = int(predictions[0])
+            note = override_note(matched[0])
+            prediction_cache.put(loaded_model.version, cache_key, (prediction, note, probability))
         
         # For debugging, include input data characteristics in response
         debug_info = {
@@ -144,30 +328,330 @@ def predict():
         response_data = {
             'success': True,
             'prediction': '>50K' if prediction == 1 else '<=50K',
+            'model_version': loaded_model.version,
             'debug': debug_info
         }
         
-        if override_note:
-            response_data['note'] = override_note
+        # Calibrated probability and the decision threshold for this record's segment
+        table = loaded_model.companions['calibration']
+        if table is not None:
+            with timer.span('calibrate'):
+                calibrated, threshold, above = table.decide(
+                    [probability], [data.get(table.segment_column)])
+            response_data['probability'] = round(float(calibrated[0]), 4)
+            response_data['threshold'] = round(float(threshold[0]), 4)
+            response_data['above_threshold'] = bool(above[0])
+        else:
+            response_data['probability'] = round(probability, 4)
+        
+        # Per-feature contributions to the (uncalibrated) model probability
+        if wants_explanation():
+            with timer.span('explain'):
+                explainer = get_explainer(loaded_model)
+                if explainer is None:
+                    response_data['explanation'] = {'error': EXPLANATION_UNAVAILABLE}
+                else:
+                    # Cached and micro-batched predictions did not preprocess here
+                    if processed_data is None:
+                        processed_data = preprocess_record(
+                            data, loaded_model.companions['extensions'])
+                    base_value, contributions = explainer.contributions(processed_data)
+                    response_data['explanation'] = explanation_json(
+                        base_value, contributions[0], feature_names(explainer))
+        
+        if note:
+            response_data['note'] = note
             
-        return jsonify(response_data)
+        response = jsonify(response_data)
+        response.headers['Server-Timing'] = timer.server_timing()
+        return response
     except Exception as e:
-        import traceback
-        print(f"Error in prediction: {str(e)}")
-        print(traceback.format_exc())
+        outcome = 'error'
+        logger.exception("Error in prediction: %s", str(e))
         return jsonify({
             'success': False,
             'error': str(e)
         })
+    finally:
+        elapsed = timer.elapsed()
+        predict_requests.inc(outcome)
+        predict_request_seconds.observe(elapsed, outcome)
+        logger.debug("Prediction %s in %.2fms (%s)", outcome, elapsed * 1000, timer.server_timing())
 
-@app.route('/model-status')
-def model_status():
-    """Check if the model file exists"""
-    model_path = 'models/income_predictor.pkl'
+@app.route('/metrics')
+def metrics():
+    """Request counters and latency histograms for this worker, in Prometheus format"""
+    return Response(metrics_registry.render(), content_type=metrics_registry.content_type)
+
+def parse_batch_body(body):
+    """Parse a JSON array or NDJSON body into records plus per-record parse errors"""
+    text = body.strip()
+    if text.startswith('['):
+        items = json.loads(text)
+    else:
+        items = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(f"Invalid JSON: {str(e)}")
+    records = []
+    errors = {}
+    for i, item in enumerate(items):
+        if isinstance(item, dict):
+            records.append(item)
+        else:
+            records.append({})
+            errors[i] = item if isinstance(item, str) else "Each record must be a JSON object"
+    return records, errors
+
+def score_batch(frame, errors, loaded_model, preprocessor, chunk_size, calibration=None,
+                explainer=None):
+    """Yield one NDJSON result line per record, scoring each chunk in a single call.
+
+    Without a loaded model the fallback rules are used instead, as in /predict. With
+    a calibration table, probabilities are calibrated and compared with the threshold
+    of each record's segment. With an explainer, each result carries its feature
+    contributions.
+    """
+    from models.explanations import explain_scored, explanation_json, feature_names
+    from models.rules import fallback_rules
+    from models.scoring import score_frame, simulate_frame, override_note
+    for start in range(0, len(frame), chunk_size):
+        chunk = frame.iloc[start:start + chunk_size]
+        chunk_errors = errors[start:start + chunk_size]
+        if loaded_model is not None:
+            predictions, probabilities, chunk_errors, overrides, scored_rows, scored = score_frame(
+                loaded_model.model, preprocessor, chunk, chunk_errors, return_processed=True)
+            if calibration is not None:
+                probabilities, thresholds, above = calibration.decide(
+                    probabilities, chunk[calibration.segment_column])
+            if explainer is not None:
+                base_value, contributions = explain_scored(explainer, scored_rows, scored,
+                                                           len(chunk))
+        else:
+            predictions, rules = simulate_frame(chunk, chunk_errors)
+
+        lines = []
+        for i in range(len(chunk)):
+            if chunk_errors[i] is not None:
+                result = {'index': start + i, 'success': False, 'error': chunk_errors[i]}
+            else:
+                result = {
+                    'index': start + i,
+                    'success': True,
+                    'prediction': '>50K' if predictions[i] == 1 else '<=50K',
+                }
+                if loaded_model is not None:
+                    result['probability'] = round(float(probabilities[i]), 4)
+                    if calibration is not None:
+                        result['threshold'] = round(float(thresholds[i]), 4)
+                        result['above_threshold'] = bool(above[i])
+                    if explainer is not None:
+                        result['explanation'] = explanation_json(
+                            base_value, contributions[i], feature_names(explainer))
+                    note = override_note(overrides[i])
+                    if note:
+                        result['note'] = note
+                else:
+                    result['rule'] = fallback_rules.rule_name(rules[i])
+            lines.append(json.dumps(result))
+        yield '\n'.join(lines) + '\n'
+
+@app.route('/predict/sweep', methods=['POST'])
+def predict_sweep():
+    """Score one profile over a grid of values for one or two features.
+
+    The body is {"profile": {...}, "vary": {"education": null, "hours-per-week":
+    {"start": 20, "stop": 60, "step": 5}}}. The whole grid is preprocessed and
+    scored in one predict_proba call. Grids are nested lists indexed by the values
+    of each varied feature in order.
+    """
+    import numpy as np
+    import pandas as pd
+    from models.input_utils import missing_fields, fill_defaults, validate_frame
+    from models.scoring import score_frame
+    from models.sweep import build_grid, decision_boundary
+    try:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not isinstance(body.get('profile'), dict):
+            return jsonify({'success': False, 'error': "Send a JSON object with 'profile' and 'vary'"}), 400
+        profile = dict(body['profile'])
+        missing = missing_fields(profile)
+        if missing:
+            return jsonify({'success': False, 'error': f"Missing required fields: {', '.join(missing)}"}), 400
+        fill_defaults(profile)
+        try:
+            axes, frame = build_grid(profile, body.get('vary'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        loaded_model = model_registry.get()
+        if loaded_model is None:
+            return jsonify({'success': False, 'error': "No trained model; run train_model.py"}), 503
+        errors = validate_frame(frame)
+        predictions, probabilities, errors, _ = score_frame(
+            loaded_model.model, loaded_model.companions['preprocessor'], frame, errors)
+        if not pd.isna(errors).all():
+            return jsonify({'success': False, 'error': next(e for e in errors if e is not None)}), 400
+
+        shape = [len(values) for _, values in axes]
+        result = {
+            'success': True,
+            'model_version': loaded_model.version,
+            'axes': [{'feature': feature, 'values': values} for feature, values in axes],
+            'prediction': np.where(predictions == 1, '>50K', '<=50K').reshape(shape).tolist(),
+            'boundary': decision_boundary(axes, predictions),
+        }
+        table = loaded_model.companions['calibration']
+        if table is not None:
+            calibrated, thresholds, above = table.decide(probabilities, frame[table.segment_column])
+            result['probability'] = calibrated.round(4).reshape(shape).tolist()
+            result['threshold'] = thresholds.round(4).reshape(shape).tolist()
+            result['above_threshold'] = above.reshape(shape).tolist()
+        else:
+            result['probability'] = probabilities.round(4).reshape(shape).tolist()
+        return jsonify(result)
+    except Exception as e:
+        logger.exception("Error in sweep: %s", str(e))
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score a JSON array or NDJSON body of records, streaming NDJSON results back"""
+    import pandas as pd
+    from models.input_utils import fill_frame_defaults, validate_frame
+    try:
+        records, parse_errors = parse_batch_body(request.get_data(as_text=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f"Invalid JSON: {str(e)}"}), 400
+    if not records:
+        return jsonify({'success': False, 'error': "No records supplied"}), 400
+
+    loaded_model = model_registry.get()
+    chunk_size = request.args.get('chunk_size', BATCH_CHUNK_SIZE, type=int)
+    if chunk_size <= 0:
+        chunk_size = BATCH_CHUNK_SIZE
+
+    # Validate and fill defaults for every row at once. The index keeps one row per
+    # item even when no item is an object, so each gets its own error line
+    frame = pd.DataFrame.from_records(records, index=range(len(records)))
+    errors = validate_frame(frame)
+    for i, error in parse_errors.items():
+        errors[i] = error
+    fill_frame_defaults(frame)
+    drift_monitor.observe(frame[pd.isna(errors)])
+
+    headers = {'X-Model-Version': loaded_model.version if loaded_model else 'rules'}
+    explainer = None
+    if loaded_model is not None and wants_explanation():
+        explainer = get_explainer(loaded_model)
+        if explainer is None:
+            return jsonify({'success': False, 'error': EXPLANATION_UNAVAILABLE}), 409
+    tables = loaded_model.companions if loaded_model is not None else {}
+    return Response(score_batch(frame, errors, loaded_model, tables.get('preprocessor'),
+                                chunk_size, tables.get('calibration'), explainer),
+                    mimetype='application/x-ndjson', headers=headers)
+
+@app.route('/rules/stats')
+def rules_stats():
+    """How often each fallback and override rule has fired in this worker"""
+    from models.rules import rule_stats
+    return jsonify(rule_stats())
+
+@app.route('/api/stats')
+def api_stats():
+    """Dataset value counts, crosstabs and group statistics from the summary cache"""
+    from models.dataset_summary import load_summary, summary_to_json
+    try:
+        st = os.stat(DATASET_PATH)
+    except OSError:
+        return jsonify({'success': False, 'error': f"Dataset not found: {DATASET_PATH}"}), 404
+    stat = (st.st_mtime_ns, st.st_size)
+    if _stats_cache['stat'] != stat:
+        _stats_cache['payload'] = summary_to_json(load_summary(DATASET_PATH))
+        _stats_cache['stat'] = stat
+    return jsonify(_stats_cache['payload'])
+
+def get_cube():
+    """The data cube for the dataset as it is now, or None if there is no dataset"""
+    from models.data_cube import load_cube
+    try:
+        st = os.stat(DATASET_PATH)
+    except OSError:
+        return None
+    stat = (st.st_mtime_ns, st.st_size)
+    if _cube_cache['stat'] != stat:
+        _cube_cache['cube'] = load_cube(DATASET_PATH)
+        _cube_cache['stat'] = stat
+    return _cube_cache['cube']
+
+@app.route('/api/analysis/query')
+def analysis_query():
+    """Counts and >50K rates grouped and filtered by dataset dimensions.
+
+    ?group_by=occupation,gender groups the rows; any dimension given as a parameter
+    filters them (comma-separate or repeat it for several values), e.g.
+    ?group_by=occupation&gender=Female&age_group=35-44. ?sort=count or ?sort=rate
+    orders groups from the largest, and ?limit=N keeps the first N. Other parameters
+    (a cache-buster, say) are ignored unless ?strict=1 asks for them to be rejected.
+    """
+    start = time.perf_counter()
+    cube = get_cube()
+    if cube is None:
+        return jsonify({'success': False, 'error': f"Dataset not found: {DATASET_PATH}"}), 404
+    group_by = [dim for value in request.args.getlist('group_by') for dim in value.split(',') if dim]
+    filters = {dim: [v for value in request.args.getlist(dim) for v in value.split(',')]
+               for dim in request.args if dim in cube.dimensions}
+    unknown = [name for name in request.args
+               if name not in cube.dimensions and name not in ('group_by', 'sort', 'limit', 'strict')]
+    sort = request.args.get('sort')
+    try:
+        if unknown and request.args.get('strict', '').lower() in ('1', 'true', 'yes'):
+            raise ValueError(f"Unknown parameters: {', '.join(unknown)}")
+        if sort not in (None, 'count', 'rate'):
+            raise ValueError("sort must be 'count' or 'rate'")
+        limit = request.args.get('limit')
+        if limit is not None:
+            if not limit.isdigit():
+                raise ValueError("limit must be a non-negative integer")
+            limit = int(limit)
+        rows = cube.query(group_by, filters)
+        total = cube.query([], filters)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e),
+                        'dimensions': {dim: cube.levels[dim] for dim in cube.dimensions}}), 400
+    if sort is not None:
+        key = 'count' if sort == 'count' or 'income' in group_by else 'high_income_rate'
+        rows.sort(key=lambda row: row[key], reverse=True)
     return jsonify({
-        'model_exists': os.path.exists(model_path),
-        'model_path': model_path
+        'success': True,
+        'group_by': group_by,
+        'filters': filters,
+        'groups': len(rows),
+        'rows': rows[:limit],
+        'total': total[0] if total else {'count': 0},
+        'csv_sha256': cube.csv_sha256,
+        'query_ms': round((time.perf_counter() - start) * 1000, 3),
     })
 
+@app.route('/drift')
+def drift():
+    """PSI and KS drift scores of recent /predict inputs against the training data"""
+    return jsonify(drift_monitor.report())
+
+@app.route('/model-status')
+def model_status():
+    """Report whether a model is loaded, its version and when it was loaded"""
+    status = model_registry.status()
+    status['prediction_cache'] = prediction_cache.stats()
+    status['micro_batching'] = predict_batcher.stats()
+    return jsonify(status)
+
 if __name__ == '__main__':
+    # The debug reloader re-runs this file in a child process, which does the serving
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warm_up()
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
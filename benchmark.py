@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from models.dataset_store import load_dataset
+from models.synthetic_data import synthesize, write_synthetic_csv
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = 'benchmarks/results.json'
+DEFAULT_BASELINE = 'benchmarks/baseline.json'
+
+# Changes smaller than this are timer noise, whatever their relative size
+NOISE_FLOOR = {'s': 0.01, 'ms': 1.0}
+
+# Run in a fresh interpreter: import the app, wait for /ready, then time one /predict
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+client = app.app.test_client()
+app.start_warm_up()
+while client.get('/ready').status_code != 200:
+    time.sleep(0.005)
+ready = time.perf_counter() - start
+record = json.loads(sys.argv[1])
+predict_start = time.perf_counter()
+response = client.post('/predict', json=record)
+first_predict = time.perf_counter() - predict_start
+print(json.dumps({'import': imported, 'ready': ready, 'first_predict': first_predict,
+                  'success': response.get_json().get('success', False)}))
+'''
+CLI_SCRIPTS = ['train_model.py', 'score_file.py', 'generate_visualizations.py', 'serve.py']
+
+
+def add_metric(metrics, name, value, unit, better):
+    metrics[name] = {'value': round(float(value), 6), 'unit': unit, 'better': better}
+    print(f"  {name}: {value:,.4f} {unit}")
+
+
+def median_time(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def bench_training(metrics, base, sizes, workspace):
+    """Run train_model.py end to end on synthetic data in the workspace"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+    for size in sizes:
+        print(f"Training on {size:,} synthetic rows...")
+        write_synthetic_csv(base, os.path.join(workspace, 'adult.csv'), size)
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.join(REPO_DIR, 'train_model.py')],
+                                cwd=workspace, env=env, capture_output=True, text=True)
+        seconds = time.perf_counter() - start
+        report_path = os.path.join(workspace, 'models', 'training_report.json')
+        if result.returncode != 0 or not os.path.exists(report_path):
+            print(result.stdout[-2000:], result.stderr[-2000:])
+            raise SystemExit(f"train_model.py failed on {size:,} rows")
+        add_metric(metrics, f'train.total_seconds.{size}', seconds, 's', 'lower')
+        with open(report_path) as f:
+            report = json.load(f)
+        for phase, phase_seconds in report.get('phase_seconds', {}).items():
+            add_metric(metrics, f'train.{phase}_seconds.{size}', phase_seconds, 's', 'lower')
+
+
+def bench_preprocessing(metrics, base, sizes, single_rows):
+    """preprocess_data one record at a time vs FramePreprocessor on whole frames"""
+    from models.model_utils import preprocess_data, FEATURE_ORDER
+    from models.frame_utils import FramePreprocessor
+
+    print("Preprocessing...")
+    records = synthesize(base, single_rows, random_state=1)[FEATURE_ORDER].to_dict('records')
+    start = time.perf_counter()
+    for record in records:
+        try:
+            preprocess_data(record)
+        except Exception:
+            pass
+    add_metric(metrics, 'preprocess.single.rows_per_sec',
+               len(records) / (time.perf_counter() - start), 'rows/s', 'higher')
+
+    for size in sizes:
+        frame = synthesize(base, size, random_state=2)[FEATURE_ORDER]
+        preprocessor = FramePreprocessor()
+        start = time.perf_counter()
+        preprocessor.transform(frame, return_invalid=True)
+        cold = time.perf_counter() - start
+        warm = median_time(lambda: preprocessor.transform(frame, return_invalid=True))
+        add_metric(metrics, f'preprocess.batch_cold.rows_per_sec.{size}', size / cold, 'rows/s', 'higher')
+        add_metric(metrics, f'preprocess.batch_warm.rows_per_sec.{size}', size / warm, 'rows/s', 'higher')
+
+
+def bench_model_load(metrics):
+    import joblib
+    from models.forest_export import load_array_forest
+
+    print("Model loading...")
+    add_metric(metrics, 'model_load.pickle_seconds',
+               median_time(lambda: joblib.load('models/income_predictor.pkl')), 's', 'lower')
+    add_metric(metrics, 'model_load.arrays_seconds',
+               median_time(lambda: load_array_forest('models/income_predictor_forest/meta.json')),
+               's', 'lower')
+
+
+def bench_startup(metrics, base, repeat=3):
+    """Cold-start costs, each measured in a fresh interpreter"""
+    print("Starting the app and CLIs from cold...")
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    features = [col for col in base.columns if col != 'income']
+    record = synthesize(base, 1, random_state=5)[features].to_dict('records')[0]
+    record = json.dumps({k: v.item() if hasattr(v, 'item') else v for k, v in record.items()})
+
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, record],
+                                env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(result.stdout[-2000:], result.stderr[-2000:])
+            raise SystemExit("Starting the app failed")
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    if not all(run['success'] for run in runs):
+        print("  The first /predict after warm-up failed")
+    add_metric(metrics, 'startup.import_app_seconds', np.median([r['import'] for r in runs]), 's', 'lower')
+    add_metric(metrics, 'startup.ready_seconds', np.median([r['ready'] for r in runs]), 's', 'lower')
+    add_metric(metrics, 'startup.first_predict_ms',
+               np.median([r['first_predict'] for r in runs]) * 1000, 'ms', 'lower')
+
+    for script in CLI_SCRIPTS:
+        seconds = median_time(lambda: subprocess.run(
+            [sys.executable, os.path.join(REPO_DIR, script), '--help'],
+            env=env, capture_output=True, check=True), repeat)
+        add_metric(metrics, f'startup.cli_help_seconds.{script[:-3]}', seconds, 's', 'lower')
+
+
+def bench_predict(metrics, base, concurrency_levels, n_requests):
+    """/predict latency through Flask's test client, with the prediction cache off"""
+    os.environ['PREDICTION_CACHE_SIZE'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from app import app
+
+    print("Serving /predict...")
+    features = [col for col in base.columns if col != 'income']
+    records = synthesize(base, n_requests, random_state=3)[features].to_dict('records')
+    records = [{k: v.item() if hasattr(v, 'item') else v for k, v in r.items()} for r in records]
+    local = threading.local()
+
+    def post(record):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        start = time.perf_counter()
+        response = local.client.post('/predict', json=record)
+        elapsed = time.perf_counter() - start
+        return elapsed, response.get_json().get('success', False)
+
+    for record in records[:20]:
+        post(record)
+    for level in concurrency_levels:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(level) as pool:
+            results = list(pool.map(post, records))
+        wall = time.perf_counter() - start
+        latencies = np.array([elapsed for elapsed, _ in results]) * 1000
+        failures = sum(not ok for _, ok in results)
+        if failures:
+            print(f"  {failures} of {len(results)} requests failed at concurrency {level}")
+        for q in (50, 90, 99):
+            add_metric(metrics, f'predict.p{q}_ms.c{level}', np.percentile(latencies, q), 'ms', 'lower')
+        add_metric(metrics, f'predict.requests_per_sec.c{level}', len(results) / wall, 'req/s', 'higher')
+
+
+def bench_explain(metrics, base, n_requests, sizes):
+    """Cost of ?explain=1 on /predict and of batch contributions on the exported forest"""
+    os.environ['PREDICTION_CACHE_SIZE'] = '0'
+    from app import app
+    from models.explanations import load_explainer
+    from models.frame_utils import FramePreprocessor
+    from models.model_utils import FEATURE_ORDER
+
+    print("Explanations...")
+    features = [col for col in base.columns if col != 'income']
+    records = synthesize(base, n_requests, random_state=4)[features].to_dict('records')
+    records = [{k: v.item() if hasattr(v, 'item') else v for k, v in r.items()} for r in records]
+    client = app.test_client()
+    latencies = {}
+    for path in ('/predict', '/predict?explain=1'):
+        for record in records[:20]:
+            client.post(path, json=record)
+        times = []
+        for record in records:
+            start = time.perf_counter()
+            client.post(path, json=record)
+            times.append(time.perf_counter() - start)
+        latencies[path] = np.array(times) * 1000
+    for q in (50, 99):
+        add_metric(metrics, f'explain.p{q}_ms.c1', np.percentile(latencies['/predict?explain=1'], q),
+                   'ms', 'lower')
+    add_metric(metrics, 'explain.added_p50_ms.c1',
+               np.percentile(latencies['/predict?explain=1'], 50) - np.percentile(latencies['/predict'], 50),
+               'ms', 'lower')
+
+    explainer = load_explainer(None, forest_dir='models/income_predictor_forest')
+    preprocessor = FramePreprocessor()
+    for size in sizes:
+        processed, invalid = preprocessor.transform(synthesize(base, size, random_state=5)[FEATURE_ORDER],
+                                                    return_invalid=True)
+        processed = processed[~invalid]
+        add_metric(metrics, f'explain.batch.rows_per_sec.{size}',
+                   size / median_time(lambda: explainer.contributions(processed)), 'rows/s', 'higher')
+
+
+def compare(results, baseline, tolerance):
+    """Print how each metric moved against the baseline; returns the regressed names"""
+    regressions = []
+    print(f"\nComparison with baseline from {baseline.get('created_at')} "
+          f"(tolerance {tolerance:.0%}):")
+    for name, current in results['metrics'].items():
+        previous = baseline['metrics'].get(name)
+        if previous is None or not previous['value']:
+            continue
+        change = (current['value'] - previous['value']) / previous['value']
+        worse = change > tolerance if current['better'] == 'lower' else change < -tolerance
+        if abs(current['value'] - previous['value']) < NOISE_FLOOR.get(current['unit'], 0):
+            worse = False
+        flag = 'REGRESSION' if worse else ''
+        print(f"  {name:45s} {previous['value']:>14,.4f} -> {current['value']:>14,.4f} "
+              f"{current['unit']:6s} {change:+7.1%} {flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing, training and serving")
+    parser.add_argument('--dataset', default='adult.csv', help="Dataset whose schema the synthetic data follows")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help="Synthetic row counts for the batch preprocessing benchmark")
+    parser.add_argument('--train-sizes', type=int, nargs='+', default=[10000],
+                        help="Synthetic row counts to train on; the last model is used for serving")
+    parser.add_argument('--single-rows', type=int, default=2000,
+                        help="Records passed one at a time to preprocess_data")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                        help="Concurrent /predict clients")
+    parser.add_argument('--requests', type=int, default=500, help="/predict requests per concurrency level")
+    parser.add_argument('--explain-sizes', type=int, nargs='+', default=[10000, 100000],
+                        help="Rows explained in one call for the batch contributions benchmark")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Also store the results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Relative slowdown allowed before a metric counts as a regression")
+    parser.add_argument('--keep-workspace', action='store_true')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline)
+    # Plain dtypes, as train_model.py loads them and requests arrive
+    base = load_dataset(args.dataset, as_category=False)
+
+    # Train and serve from a scratch directory so the real model is never touched
+    workspace = tempfile.mkdtemp(prefix='income-benchmark-')
+    print(f"Benchmark workspace: {workspace}")
+    metrics = {}
+    cwd = os.getcwd()
+    try:
+        bench_training(metrics, base, sorted(args.train_sizes), workspace)
+        os.chdir(workspace)
+        bench_preprocessing(metrics, base, args.sizes, args.single_rows)
+        bench_model_load(metrics)
+        bench_startup(metrics, base)
+        bench_predict(metrics, base, args.concurrency, args.requests)
+        bench_explain(metrics, base, args.requests, args.explain_sizes)
+    finally:
+        os.chdir(cwd)
+        if not args.keep_workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'metrics': metrics,
+    }
+    for path in [output] + ([baseline_path] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {path}")
+
+    if not args.save_baseline and os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} metrics regressed beyond {args.tolerance:.0%}")
+        print("No regressions")
+
+
+if __name__ == '__main__':
+    main()
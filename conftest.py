@@ -0,0 +1 @@
+# Lets pytest import the models package from the repository root
@@ -1,138 +1,125 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import argparse
+import hashlib
+import inspect
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from models.dataset_store import load_dataset
+from models.dataset_summary import load_summary, row_percent, income_rate
 
-# Create directory for visualizations if it doesn't exist
-os.makedirs('static/img', exist_ok=True)
+IMG_DIR = 'static/img'
+MANIFEST_PATH = os.path.join(IMG_DIR, 'manifest.json')
 
-# Set plot style
-plt.style.use('seaborn-v0_8-whitegrid')
-sns.set_palette('Set2')
-plt.rcParams['figure.figsize'] = (10, 6)
-plt.rcParams['font.size'] = 12
+# Above this many rows the row-level charts are drawn from binned data, sampled
+# points and precomputed quantiles, so their cost stays flat as the data grows
+LARGE_DATA_THRESHOLD = 200000
+MAX_SCATTER_POINTS = 20000
+
+# matplotlib and seaborn, imported by setup_plotting() only when a chart is drawn
+plt = None
+sns = None
+
+def setup_plotting():
+    """Import the plotting libraries and set the chart style, once per process"""
+    global plt, sns
+    if plt is not None:
+        return
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.style.use('seaborn-v0_8-whitegrid')
+    sns.set_palette('Set2')
+    plt.rcParams['figure.figsize'] = (10, 6)
+    plt.rcParams['font.size'] = 12
 
 def save_plot(name):
     """Save the current plot to the static/img directory"""
     plt.tight_layout()
-    plt.savefig(f'static/img/{name}.png', dpi=150, bbox_inches='tight')
+    plt.savefig(f'{IMG_DIR}/{name}.png', dpi=150, bbox_inches='tight')
     plt.close()
 
-def main():
-    print("Generating visualizations for the analysis page...")
-    
-    # Load dataset
-    try:
-        df = pd.read_csv('adult.csv')
-        print(f"Dataset loaded with {len(df)} records")
-    except Exception as e:
-        print(f"Error loading dataset: {str(e)}")
-        return
-    
-    # 1. Income Distribution
+# Each chart is drawn by its own function from a precomputed input, so charts
+# can be rendered in separate processes and skipped when their input is unchanged.
+
+def plot_income_distribution(income_counts):
     plt.figure(figsize=(8, 6))
-    income_counts = df['income'].value_counts()
-    plt.pie(income_counts, labels=income_counts.index, autopct='%1.1f%%', 
+    plt.pie(income_counts, labels=income_counts.index, autopct='%1.1f%%',
             startangle=90, colors=['#3498db', '#e74c3c'], explode=[0.05, 0.05],
             textprops={'fontsize': 14})
     plt.title('Income Distribution', fontsize=16)
     plt.legend(['≤ $50K', '> $50K'])
-    save_plot('income_distribution')
-    
-    # 2. Gender Distribution
+
+def plot_gender_distribution(gender_counts):
     plt.figure(figsize=(8, 6))
-    gender_counts = df['gender'].value_counts()
-    plt.pie(gender_counts, labels=gender_counts.index, autopct='%1.1f%%', 
+    plt.pie(gender_counts, labels=gender_counts.index, autopct='%1.1f%%',
             startangle=90, colors=['#3498db', '#e74c3c'], explode=[0.05, 0.05],
             textprops={'fontsize': 14})
     plt.title('Gender Distribution', fontsize=16)
-    save_plot('gender_distribution')
-    
-    # 3. Age Distribution
+
+def plot_age_distribution(ages):
     plt.figure(figsize=(10, 6))
-    sns.histplot(df['age'], bins=20, kde=True)
+    sns.histplot(ages, bins=20, kde=True)
     plt.title('Age Distribution', fontsize=16)
     plt.xlabel('Age', fontsize=14)
     plt.ylabel('Count', fontsize=14)
-    save_plot('age_distribution')
-    
-    # 4. Income by Education Level
+
+def plot_education_income(education_income):
     plt.figure(figsize=(12, 8))
-    education_income = pd.crosstab(df['education'], df['income'], normalize='index') * 100
-    education_income = education_income.sort_values(by='>50K', ascending=False)
     education_income['>50K'].plot(kind='barh', color='#3498db')
     plt.title('Percentage of Individuals with Income >$50K by Education Level', fontsize=16)
     plt.xlabel('Percentage (%)', fontsize=14)
     plt.ylabel('Education Level', fontsize=14)
     plt.xlim(0, 100)
     plt.grid(axis='x')
-    save_plot('education_income')
-    
-    # 5. Education Level Distribution
+
+def plot_education_distribution(education_counts):
     plt.figure(figsize=(10, 6))
-    education_counts = df['education'].value_counts()
-    plt.pie(education_counts, labels=None, autopct=None, 
+    plt.pie(education_counts, labels=None, autopct=None,
             startangle=90, wedgeprops={'edgecolor': 'w'})
     plt.legend(education_counts.index, loc="center left", bbox_to_anchor=(1, 0.5))
     plt.title('Education Level Distribution', fontsize=16)
-    save_plot('education_distribution')
-    
-    # 6. Income by Occupation
+
+def plot_occupation_income(occupation_income):
     plt.figure(figsize=(12, 8))
-    occupation_income = pd.crosstab(df['occupation'], df['income'], normalize='index') * 100
-    occupation_income = occupation_income.sort_values(by='>50K', ascending=False)
     occupation_income['>50K'].plot(kind='barh', color='#3498db')
     plt.title('Percentage of Individuals with Income >$50K by Occupation', fontsize=16)
     plt.xlabel('Percentage (%)', fontsize=14)
     plt.ylabel('Occupation', fontsize=14)
     plt.xlim(0, 100)
     plt.grid(axis='x')
-    save_plot('occupation_income')
-    
-    # 7. Occupation Distribution
+
+def plot_occupation_distribution(occupation_counts):
     plt.figure(figsize=(10, 6))
-    occupation_counts = df['occupation'].value_counts()
     occupation_counts.plot(kind='bar', color='#3498db')
     plt.title('Occupation Distribution', fontsize=16)
     plt.xlabel('Occupation', fontsize=14)
     plt.ylabel('Count', fontsize=14)
     plt.xticks(rotation=45, ha='right')
-    save_plot('occupation_distribution')
-    
-    # 8. Income by Age Group
+
+def plot_age_income(age_income):
     plt.figure(figsize=(10, 6))
-    df['age_group'] = pd.cut(df['age'], bins=[16, 25, 35, 45, 55, 65, 100], 
-                            labels=['<25', '25-34', '35-44', '45-54', '55-64', '65+'])
-    age_income = pd.crosstab(df['age_group'], df['income'], normalize='index') * 100
     age_income['>50K'].plot(kind='bar', color='#3498db')
     plt.title('Percentage of Individuals with Income >$50K by Age Group', fontsize=16)
     plt.xlabel('Age Group', fontsize=14)
     plt.ylabel('Percentage (%)', fontsize=14)
     plt.ylim(0, 50)
     plt.grid(axis='y')
-    save_plot('age_income')
-    
-    # 9. Gender and Income
+
+def plot_gender_income(gender_income):
     plt.figure(figsize=(10, 6))
-    gender_income = pd.crosstab(df['gender'], df['income'], normalize='index') * 100
     gender_income['>50K'].plot(kind='bar', color='#3498db')
     plt.title('Percentage of Individuals with Income >$50K by Gender', fontsize=16)
     plt.xlabel('Gender', fontsize=14)
     plt.ylabel('Percentage (%)', fontsize=14)
     plt.ylim(0, 40)
     plt.grid(axis='y')
-    save_plot('gender_income')
-    
-    # 10. Gender & Education vs. Income
+
+def plot_gender_education_income(gender_edu_income_pivot):
     plt.figure(figsize=(12, 8))
-    gender_edu_income = df.groupby(['gender', 'education'])['income'].apply(
-        lambda x: (x == '>50K').mean() * 100).reset_index()
-    gender_edu_income_pivot = pd.pivot_table(gender_edu_income, 
-                                           values='income', 
-                                           index='education', 
-                                           columns='gender')
-    gender_edu_income_pivot = gender_edu_income_pivot.sort_values(by='Male', ascending=False)
     gender_edu_income_pivot.plot(kind='barh')
     plt.title('Percentage with Income >$50K by Gender and Education', fontsize=16)
     plt.xlabel('Percentage (%)', fontsize=14)
@@ -140,22 +127,18 @@ def main():
     plt.legend(title='Gender')
     plt.xlim(0, 80)
     plt.grid(axis='x')
-    save_plot('gender_education_income')
-    
-    # 11. Education vs. Hours Worked
+
+def plot_education_hours(education_hours, order):
     plt.figure(figsize=(10, 6))
-    sns.boxplot(x='education', y='hours-per-week', data=df, showfliers=False,
-                order=education_income.index)
+    sns.boxplot(x='education', y='hours-per-week', data=education_hours, showfliers=False,
+                order=order)
     plt.title('Hours Worked per Week by Education Level', fontsize=16)
     plt.xlabel('Education Level', fontsize=14)
     plt.ylabel('Hours per Week', fontsize=14)
     plt.xticks(rotation=45, ha='right')
-    save_plot('education_hours')
-    
-    # 12. Occupation by Gender
+
+def plot_occupation_gender(occupation_gender):
     plt.figure(figsize=(12, 8))
-    occupation_gender = pd.crosstab(df['occupation'], df['gender'], normalize='index') * 100
-    occupation_gender = occupation_gender.sort_values(by='Male', ascending=False)
     occupation_gender.plot(kind='barh')
     plt.title('Gender Distribution by Occupation', fontsize=16)
     plt.xlabel('Percentage (%)', fontsize=14)
@@ -163,21 +146,226 @@ def main():
     plt.legend(title='Gender')
     plt.xlim(0, 100)
     plt.grid(axis='x')
-    save_plot('occupation_gender')
-    
-    # 13. Age vs. Hours Worked by Income
+
+def plot_age_hours_income(age_hours_income):
     plt.figure(figsize=(10, 8))
     colors = {'<=50K': '#3498db', '>50K': '#e74c3c'}
     for income, color in colors.items():
-        subset = df[df['income'] == income]
+        subset = age_hours_income[age_hours_income['income'] == income]
         plt.scatter(subset['age'], subset['hours-per-week'], c=color, alpha=0.5, label=income)
     plt.title('Age vs. Hours Worked by Income', fontsize=16)
     plt.xlabel('Age', fontsize=14)
     plt.ylabel('Hours per Week', fontsize=14)
     plt.legend(title='Income')
     plt.grid(True)
-    save_plot('age_hours_income')
-    
+
+# Large-data variants of the row-level charts. Their inputs are aggregated with
+# vectorized pandas/NumPy operations before plotting.
+
+def plot_age_distribution_binned(age_counts):
+    plt.figure(figsize=(10, 6))
+    sns.histplot(x=age_counts.index.to_numpy(), weights=age_counts.to_numpy(), bins=20, kde=True)
+    plt.title('Age Distribution', fontsize=16)
+    plt.xlabel('Age', fontsize=14)
+    plt.ylabel('Count', fontsize=14)
+
+def plot_education_hours_quantiles(box_stats):
+    plt.figure(figsize=(10, 6))
+    boxes = plt.gca().bxp(box_stats, showfliers=False, patch_artist=True)
+    for patch in boxes['boxes']:
+        patch.set_facecolor(sns.color_palette()[0])
+    for median in boxes['medians']:
+        median.set_color('#333333')
+    plt.title('Hours Worked per Week by Education Level', fontsize=16)
+    plt.xlabel('Education Level', fontsize=14)
+    plt.ylabel('Hours per Week', fontsize=14)
+    plt.xticks(rotation=45, ha='right')
+
+def plot_age_hours_income_density(cells):
+    plt.figure(figsize=(10, 8))
+    colors = {'<=50K': '#3498db', '>50K': '#e74c3c'}
+    max_log_count = np.log1p(cells['count'].max())
+    for income, color in colors.items():
+        subset = cells[cells['income'] == income]
+        # Each point is one occupied (age, hours) cell, more opaque where it holds more people
+        alpha = 0.15 + 0.85 * np.log1p(subset['count'].to_numpy()) / max_log_count
+        plt.scatter(subset['age'], subset['hours-per-week'], c=color, alpha=alpha, label=income)
+    plt.title('Age vs. Hours Worked by Income', fontsize=16)
+    plt.xlabel('Age', fontsize=14)
+    plt.ylabel('Hours per Week', fontsize=14)
+    plt.legend(title='Income')
+    plt.grid(True)
+
+def stratified_sample(df, column, n, random_state=42):
+    """Sample about n rows while keeping each value of column in proportion"""
+    frac = min(1.0, n / len(df))
+    return df.groupby(column, group_keys=False, observed=True).sample(frac=frac, random_state=random_state)
+
+def box_statistics(df, group, value, order):
+    """Per-group boxplot statistics in the form matplotlib's bxp expects.
+
+    Whiskers reach the most extreme value within 1.5 IQR of the box, as in
+    sns.boxplot.
+    """
+    grouped = df.groupby(group, observed=True)[value]
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    iqr = quartiles[0.75] - quartiles[0.25]
+    low_limit = df[group].map(quartiles[0.25] - 1.5 * iqr).astype(float)
+    high_limit = df[group].map(quartiles[0.75] + 1.5 * iqr).astype(float)
+    whislo = df[value].where(df[value] >= low_limit).groupby(df[group], observed=True).min()
+    whishi = df[value].where(df[value] <= high_limit).groupby(df[group], observed=True).max()
+    return [{'label': label,
+             'q1': float(quartiles.at[label, 0.25]),
+             'med': float(quartiles.at[label, 0.5]),
+             'q3': float(quartiles.at[label, 0.75]),
+             'whislo': float(whislo[label]),
+             'whishi': float(whishi[label]),
+             'fliers': []}
+            for label in order if label in quartiles.index]
+
+def density_cells(df, x, y, by):
+    """Count rows per (by, x, y) cell; integer-valued columns give exact point positions"""
+    return df.groupby([by, df[x].round(), df[y].round()], observed=True).size().rename('count').reset_index()
+
+def row_level_tasks(df, education_order, large):
+    """Tasks for the charts drawn from individual rows rather than the summary"""
+    if not large:
+        return {
+            'age_distribution': (plot_age_distribution, (df['age'],)),
+            'education_hours': (plot_education_hours,
+                                (df[['education', 'hours-per-week']], education_order)),
+            'age_hours_income': (plot_age_hours_income, (df[['age', 'hours-per-week', 'income']],)),
+        }
+    cells = density_cells(df, 'age', 'hours-per-week', 'income')
+    if len(cells) <= MAX_SCATTER_POINTS:
+        scatter = (plot_age_hours_income_density, (cells,))
+    else:
+        sample = stratified_sample(df[['age', 'hours-per-week', 'income']], 'income', MAX_SCATTER_POINTS)
+        scatter = (plot_age_hours_income, (sample,))
+    return {
+        'age_distribution': (plot_age_distribution_binned, (df['age'].value_counts().sort_index(),)),
+        'education_hours': (plot_education_hours_quantiles,
+                            (box_statistics(df, 'education', 'hours-per-week', education_order),)),
+        'age_hours_income': scatter,
+    }
+
+def build_tasks(summary, df, large=False):
+    """Return (name, plot function, args) for every chart, in page order"""
+    counts = summary['value_counts']
+    crosstabs = summary['crosstabs']
+    education_income = row_percent(crosstabs['education_income']).sort_values(by='>50K', ascending=False)
+    occupation_income = row_percent(crosstabs['occupation_income']).sort_values(by='>50K', ascending=False)
+    gender_edu_income_pivot = income_rate(crosstabs['gender_education_income']).unstack('gender')
+    gender_edu_income_pivot = gender_edu_income_pivot.sort_values(by='Male', ascending=False)
+    occupation_gender = row_percent(crosstabs['occupation_gender']).sort_values(by='Male', ascending=False)
+    row_level = row_level_tasks(df, list(education_income.index), large)
+    return [
+        ('income_distribution', plot_income_distribution, (counts['income'],)),
+        ('gender_distribution', plot_gender_distribution, (counts['gender'],)),
+        ('age_distribution', *row_level['age_distribution']),
+        ('education_income', plot_education_income, (education_income,)),
+        ('education_distribution', plot_education_distribution, (counts['education'],)),
+        ('occupation_income', plot_occupation_income, (occupation_income,)),
+        ('occupation_distribution', plot_occupation_distribution, (counts['occupation'],)),
+        ('age_income', plot_age_income, (row_percent(crosstabs['age_group_income']),)),
+        ('gender_income', plot_gender_income, (row_percent(crosstabs['gender_income']),)),
+        ('gender_education_income', plot_gender_education_income, (gender_edu_income_pivot,)),
+        ('education_hours', *row_level['education_hours']),
+        ('occupation_gender', plot_occupation_gender, (occupation_gender,)),
+        ('age_hours_income', *row_level['age_hours_income']),
+    ]
+
+def content_hash(plot_function, args):
+    """Hash a chart's input data together with the code that draws it"""
+    digest = hashlib.sha256(inspect.getsource(plot_function).encode())
+    for arg in args:
+        if isinstance(arg, (pd.Series, pd.DataFrame)):
+            digest.update(pd.util.hash_pandas_object(arg, index=True).values.tobytes())
+            names = list(arg.columns) if isinstance(arg, pd.DataFrame) else [arg.name]
+            digest.update(repr((names, list(arg.index.names))).encode())
+        else:
+            digest.update(repr(arg).encode())
+    return digest.hexdigest()
+
+def render_chart(name, plot_function, args):
+    """Draw and save one chart; runs in a worker process with its own figure state"""
+    start = time.perf_counter()
+    setup_plotting()
+    plot_function(*args)
+    save_plot(name)
+    return time.perf_counter() - start
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest):
+    with open(MANIFEST_PATH + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(MANIFEST_PATH + '.tmp', MANIFEST_PATH)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the charts for the analysis page")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Number of processes to render charts with")
+    parser.add_argument('--force', action='store_true', help="Redraw every chart")
+    parser.add_argument('--large-threshold', type=int, default=LARGE_DATA_THRESHOLD,
+                        help="Row count above which row-level charts use binned and sampled data")
+    args = parser.parse_args()
+
+    print("Generating visualizations for the analysis page...")
+    start = time.perf_counter()
+
+    # Load the cached aggregates, plus only the raw columns the row-level charts need
+    try:
+        summary = load_summary('adult.csv')
+        df = load_dataset('adult.csv', columns=['age', 'education', 'hours-per-week', 'income'])
+        print(f"Dataset loaded with {summary['rows']} records")
+    except Exception as e:
+        raise SystemExit(f"Error loading dataset: {str(e)}")
+    os.makedirs(IMG_DIR, exist_ok=True)
+
+    # Work out which charts changed since the last build
+    manifest = load_manifest()
+    large = summary['rows'] > args.large_threshold
+    if large:
+        print(f"Large dataset ({summary['rows']} rows): drawing row-level charts from binned data")
+    tasks = build_tasks(summary, df, large)
+    pending = []
+    failed = []
+    for name, plot_function, plot_args in tasks:
+        chart_hash = content_hash(plot_function, plot_args)
+        png_exists = os.path.exists(f'{IMG_DIR}/{name}.png')
+        if not args.force and png_exists and manifest.get(name, {}).get('hash') == chart_hash:
+            print(f"  {name}: unchanged, skipped")
+            continue
+        pending.append((name, plot_function, plot_args, chart_hash))
+
+    # Render the changed charts in parallel
+    if pending:
+        workers = max(1, min(args.workers, len(pending)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(render_chart, name, plot_function, plot_args): (name, chart_hash)
+                       for name, plot_function, plot_args, chart_hash in pending}
+            for future in as_completed(futures):
+                name, chart_hash = futures[future]
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    print(f"  {name}: failed ({str(e)})")
+                    manifest.pop(name, None)
+                    failed.append(name)
+                    continue
+                print(f"  {name}: rendered in {seconds:.2f}s")
+                manifest[name] = {'hash': chart_hash, 'seconds': round(seconds, 3)}
+        save_manifest(manifest)
+
+    print(f"{len(pending) - len(failed)} of {len(tasks)} charts redrawn in {time.perf_counter() - start:.2f}s")
+    if failed:
+        raise SystemExit(f"{len(failed)} charts failed: {', '.join(sorted(failed))}")
     print("All visualizations have been generated successfully!")
 
 if __name__ == "__main__":
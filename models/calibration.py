@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+from sklearn.isotonic import IsotonicRegression
+
+CALIBRATION_PATH = 'models/calibration.npz'
+DEFAULT_SEGMENT_COLUMN = 'gender'
+
+# Segments with fewer held-out rows than this use the overall threshold
+MIN_SEGMENT_ROWS = 200
+
+
+def best_f1_threshold(probabilities, y):
+    """The calibrated probability cut-off that maximizes F1 for the >50K class"""
+    candidates = np.unique(probabilities)
+    if len(candidates) == 0 or y.sum() == 0:
+        return 0.5
+    order = np.argsort(-probabilities, kind='stable')
+    sorted_probabilities = probabilities[order]
+    true_positives = np.cumsum(y[order])
+    # Predict >50K for every row with probability >= candidate
+    predicted = np.searchsorted(-sorted_probabilities, -candidates, side='right')
+    tp = true_positives[predicted - 1]
+    f1 = 2 * tp / (predicted + y.sum())
+    return float(candidates[np.argmax(f1)])
+
+
+def fit_calibration(raw_probabilities, y, segments, segment_column=DEFAULT_SEGMENT_COLUMN):
+    """Fit isotonic calibration and per-segment thresholds on held-out probabilities.
+
+    Returns the arrays that make up a calibration table: the isotonic breakpoints
+    (x = raw probability, y = calibrated probability) and, for each segment value
+    with enough rows, the F1-maximizing threshold on calibrated probabilities.
+    """
+    raw_probabilities = np.asarray(raw_probabilities, dtype=np.float64)
+    y = np.asarray(y, dtype=np.int64)
+    segments = np.asarray(segments, dtype=str)
+    isotonic = IsotonicRegression(out_of_bounds='clip', y_min=0.0, y_max=1.0)
+    isotonic.fit(raw_probabilities, y)
+    calibrated = isotonic.predict(raw_probabilities)
+
+    names = np.unique(segments)
+    thresholds = np.empty(len(names))
+    default_threshold = best_f1_threshold(calibrated, y)
+    for i, name in enumerate(names):
+        rows = segments == name
+        thresholds[i] = (best_f1_threshold(calibrated[rows], y[rows])
+                         if rows.sum() >= MIN_SEGMENT_ROWS else default_threshold)
+    return {
+        'x': isotonic.X_thresholds_.astype(np.float64),
+        'y': isotonic.y_thresholds_.astype(np.float64),
+        'segment_column': np.array(segment_column),
+        'segment_names': names,
+        'segment_thresholds': thresholds,
+        'default_threshold': np.array(default_threshold),
+    }
+
+
+def save_calibration(table, path=CALIBRATION_PATH):
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, **table)
+    os.replace(path + '.tmp', path)
+
+
+class CalibrationTable:
+    """Calibrated probabilities and segment thresholds from precomputed arrays.
+
+    Calibration is linear interpolation between the isotonic breakpoints, exactly
+    what IsotonicRegression.predict computes, done with np.interp's binary search.
+    Segment thresholds are found with searchsorted over the sorted segment names;
+    unseen segments get the overall threshold.
+    """
+
+    def __init__(self, arrays):
+        self.x = arrays['x']
+        self.y = arrays['y']
+        self.segment_column = str(arrays['segment_column'])
+        self.segment_names = arrays['segment_names']
+        self.segment_thresholds = arrays['segment_thresholds']
+        self.default_threshold = float(arrays['default_threshold'])
+
+    @classmethod
+    def load(cls, path=CALIBRATION_PATH):
+        """Load a saved table, or None if the model was trained without one"""
+        try:
+            with np.load(path) as arrays:
+                return cls({name: arrays[name] for name in arrays.files})
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def calibrate(self, raw_probabilities):
+        return np.interp(np.asarray(raw_probabilities, dtype=np.float64), self.x, self.y)
+
+    def thresholds(self, segments):
+        segments = np.asarray(segments, dtype=str)
+        if len(self.segment_names) == 0:
+            return np.full(len(segments), self.default_threshold)
+        index = np.searchsorted(self.segment_names, segments)
+        index = np.minimum(index, len(self.segment_names) - 1)
+        known = self.segment_names[index] == segments
+        return np.where(known, self.segment_thresholds[index], self.default_threshold)
+
+    def decide(self, raw_probabilities, segments):
+        """Returns calibrated probabilities, their thresholds and the >= decisions"""
+        calibrated = self.calibrate(raw_probabilities)
+        thresholds = self.thresholds(segments)
+        return calibrated, thresholds, calibrated >= thresholds
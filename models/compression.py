@@ -0,0 +1,149 @@
+import os
+import time
+
+import numpy as np
+
+from models.forest_export import ArrayForest, export_forest, node_depths
+
+COMPACT_DIR = 'models/income_predictor_compact'
+
+# Validation accuracy the compact variant may lose against the full forest
+DEFAULT_TOLERANCE = 0.005
+# One-sided 95% normal quantile: the loss must be within tolerance at this bound
+CONFIDENCE_Z = 1.645
+
+# Depth caps tried besides the forest's own depth
+DEPTH_CANDIDATES = [4, 6, 8, 10, 12, 14, 16, 20, 24, 32]
+
+
+def capped_tree_probabilities(tree, X, max_depth):
+    """Positive-class probability of one sklearn tree with its depth capped.
+
+    Rows stop at the last node they reach at or above max_depth, which then predicts
+    its own class mix; this is what export_forest(max_depth=...) serves.
+    """
+    nodes = np.zeros(len(X), dtype=np.int64)
+    rows = np.arange(len(X))
+    for _ in range(max_depth):
+        internal = tree.children_left[nodes] != -1
+        go_left = X[rows, tree.feature[nodes]] <= tree.threshold[nodes]
+        nodes = np.where(internal, np.where(go_left, tree.children_left[nodes],
+                                            tree.children_right[nodes]), nodes)
+    value = tree.value[nodes, 0, :]
+    return value[:, -1] / value.sum(axis=1)
+
+
+def search_compression(model, X, y, tolerance=DEFAULT_TOLERANCE):
+    """The smallest (n_trees, max_depth) within tolerance of the forest's accuracy.
+
+    Per-tree probabilities are computed once for each depth cap; a running sum over
+    trees then gives the accuracy of every prefix of the forest, so every candidate
+    is scored without refitting or re-predicting. Size is the total node count.
+
+    A few hundred rows can't tell small accuracy differences from noise, so a
+    candidate qualifies only if the upper end of a one-sided 95% confidence interval
+    on its accuracy loss stays within tolerance. The interval uses the standard error
+    of the per-row differences from the full forest. The smaller the holdout, the
+    closer to the full forest the choice has to be.
+
+    Returns a dict with the choice, its accuracy, node count and loss bound, and the
+    full forest's accuracy.
+    """
+    positive = np.asarray(y) == model.classes_[-1]
+    full_correct = (model.predict_proba(X)[:, -1] > 0.5) == positive
+    full_accuracy = float(full_correct.mean())
+    X = np.asarray(X, dtype=np.float32)
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    depths = [node_depths(tree) for tree in trees]
+    full_depth = max(int(depth.max()) for depth in depths)
+    n_trees = np.arange(1, len(trees) + 1)
+    # The whole forest is the fallback if nothing smaller qualifies
+    best = {'n_trees': len(trees), 'max_depth': full_depth,
+            'n_nodes': int(sum(len(depth) for depth in depths)), 'accuracy': full_accuracy,
+            'loss_bound': 0.0}
+    for max_depth in sorted({d for d in DEPTH_CANDIDATES if d < full_depth} | {full_depth}):
+        probabilities = np.array([capped_tree_probabilities(tree, X, max_depth) for tree in trees])
+        # Two classes: predict_proba's argmax picks the positive class only above 0.5
+        predictions = np.cumsum(probabilities, axis=0) / n_trees[:, np.newaxis] > 0.5
+        correct = predictions == positive
+        accuracy = correct.mean(axis=1)
+        differences = full_correct.astype(np.float64) - correct
+        loss_bound = (differences.mean(axis=1) + CONFIDENCE_Z
+                      * differences.std(axis=1, ddof=1) / np.sqrt(len(positive)))
+        nodes = np.cumsum([(depth <= max_depth).sum() for depth in depths])
+        ok = np.flatnonzero(loss_bound <= tolerance)
+        if len(ok) == 0:
+            continue
+        i = ok[np.argmin(nodes[ok])]
+        if nodes[i] < best['n_nodes']:
+            best = {'n_trees': int(n_trees[i]), 'max_depth': max_depth,
+                    'n_nodes': int(nodes[i]), 'accuracy': float(accuracy[i]),
+                    'loss_bound': float(loss_bound[i])}
+    best['full_accuracy'] = full_accuracy
+    best['tolerance'] = tolerance
+    return best
+
+
+def export_size(forest):
+    """Bytes on disk of one ArrayForest export: its meta.json and the arrays it names"""
+    return (os.path.getsize(os.path.join(forest.directory, 'meta.json'))
+            + sum(entry.stat().st_size for entry in os.scandir(forest.array_dir)
+                  if entry.name.endswith('.npy')))
+
+
+def measure(model, X, y):
+    """Accuracy, single-row p50 latency and batch throughput of a model on X"""
+    accuracy = float((model.predict(X) == np.asarray(y)).mean())
+    times = []
+    for i in range(min(len(X), 200)):
+        row = X[i:i + 1]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    model.predict_proba(X)
+    batch_seconds = time.perf_counter() - start
+    return {
+        'accuracy': round(accuracy, 5),
+        'single_p50_ms': round(float(np.median(times)) * 1000, 3),
+        'batch_rows_per_sec': round(len(X) / batch_seconds),
+    }
+
+
+def compress_model(model, model_path, forest_dir, X_val, y_val, X_test, y_test,
+                   tolerance=DEFAULT_TOLERANCE, directory=COMPACT_DIR, source_sha256=None):
+    """Write the compact variant of model and compare it with the full model.
+
+    The compact variant keeps the fewest trees and the shallowest depth found by
+    search_compression on the validation rows, in the array format with float32
+    thresholds and probabilities. Returns a report of size, latency and accuracy
+    for the pickle, the full array export and the compact variant, measured on the
+    test rows, which played no part in the choice.
+    """
+    choice = search_compression(model, X_val, y_val, tolerance)
+    export_forest(model, directory, source_sha256=source_sha256, n_trees=choice['n_trees'],
+                  max_depth=choice['max_depth'], compact=True, compression=choice)
+    arrays, compact = ArrayForest(forest_dir), ArrayForest(directory)
+    variants = {
+        'pickle': (model, os.path.getsize(model_path)),
+        'arrays': (arrays, export_size(arrays)),
+        'compact': (compact, export_size(compact)),
+    }
+    report = {'choice': choice, 'validation_rows': len(X_val), 'test_rows': len(X_test),
+              'variants': {}}
+    for name, (variant, size) in variants.items():
+        report['variants'][name] = {'size_bytes': size, **measure(variant, X_test, y_test)}
+    return report
+
+
+def print_report(report):
+    choice = report['choice']
+    print(f"Compact variant: {choice['n_trees']} trees, depth <= {choice['max_depth']}, "
+          f"{choice['n_nodes']:,} nodes (accuracy loss at most {choice['loss_bound']:.4f} "
+          f"at 95% confidence, tolerance {choice['tolerance']:.3f}, "
+          f"chosen on {report['validation_rows']:,} validation rows)")
+    print(f"  Measured on {report['test_rows']:,} test rows not used for the choice:")
+    print(f"  {'variant':8s} {'size':>10s} {'p50 1 row':>10s} {'rows/sec':>12s} {'accuracy':>9s}")
+    for name, row in report['variants'].items():
+        print(f"  {name:8s} {row['size_bytes'] / 1e6:>8.2f}MB {row['single_p50_ms']:>8.3f}ms "
+              f"{row['batch_rows_per_sec']:>12,} {row['accuracy']:>9.4f}")
@@ -0,0 +1,156 @@
+import logging
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from models.dataset_store import load_dataset
+from models.dataset_summary import DEFAULT_CSV_PATH, add_age_group
+from models.registry import file_sha256
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CUBE_PATH = 'cache/data_cube.npz'
+
+DIMENSIONS = ['education', 'occupation', 'gender', 'age_group', 'workclass', 'income']
+HIGH_INCOME = '>50K'
+MISSING_LABEL = '(missing)'
+
+
+def _encode(values):
+    """Integer codes and their labels for one dimension; missing values get a label.
+
+    Categoricals keep their category order, so age groups stay in age order.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, labels = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, labels = pd.factorize(values, sort=True)
+    codes = np.asarray(codes, dtype=np.int64)
+    labels = [str(label) for label in labels]
+    if (codes == -1).any():
+        codes = np.where(codes == -1, len(labels), codes)
+        labels.append(MISSING_LABEL)
+    return codes, labels
+
+
+class DataCube:
+    """Row counts for every combination of the analysis dimensions.
+
+    The cube is a dense array with one axis per dimension, so a query is a
+    selection along the filtered axes followed by a sum over the axes it does not
+    group by. Its size depends only on the number of distinct values, never on the
+    number of rows.
+    """
+
+    def __init__(self, counts, levels, csv_sha256=None, built_at=None):
+        self.counts = counts
+        self.levels = levels
+        self.dimensions = list(levels)
+        self.csv_sha256 = csv_sha256
+        self.built_at = built_at
+        self._positions = {dim: {label: i for i, label in enumerate(labels)}
+                           for dim, labels in levels.items()}
+
+    @classmethod
+    def build(cls, df, csv_sha256=None):
+        """Count every combination of DIMENSIONS in one bincount over encoded columns"""
+        df = add_age_group(df[[col for col in DIMENSIONS if col != 'age_group'] + ['age']].copy())
+        codes, levels = [], {}
+        for dim in DIMENSIONS:
+            dim_codes, levels[dim] = _encode(df[dim])
+            codes.append(dim_codes)
+        shape = tuple(len(labels) for labels in levels.values())
+        cells = np.ravel_multi_index(codes, shape)
+        counts = np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+        return cls(counts.astype(np.int64), levels, csv_sha256,
+                   datetime.now(timezone.utc).isoformat())
+
+    def save(self, path=DEFAULT_CUBE_PATH):
+        arrays = {f'levels_{dim}': np.array(labels) for dim, labels in self.levels.items()}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, counts=self.counts, dimensions=np.array(self.dimensions),
+                     csv_sha256=np.array(self.csv_sha256 or ''),
+                     built_at=np.array(self.built_at or ''), **arrays)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_CUBE_PATH):
+        with np.load(path) as arrays:
+            levels = {str(dim): [str(label) for label in arrays[f'levels_{dim}']]
+                      for dim in arrays['dimensions']}
+            return cls(arrays['counts'], levels, str(arrays['csv_sha256']) or None,
+                       str(arrays['built_at']) or None)
+
+    def query(self, group_by=(), filters=None):
+        """Counts and >50K rates per group after filtering.
+
+        group_by is a list of dimensions; filters maps a dimension to the values to
+        keep. Unknown dimensions or values raise ValueError. Groups with no rows are
+        left out. Unless income is grouped by, every group also gets the number and
+        percentage of its rows earning >50K.
+        """
+        filters = filters or {}
+        for dim in list(group_by) + list(filters):
+            if dim not in self._positions:
+                raise ValueError(f"Unknown dimension '{dim}'; choose from {', '.join(self.dimensions)}")
+        if len(set(group_by)) != len(group_by):
+            raise ValueError("A dimension can only be grouped by once")
+
+        selections = []
+        for dim in self.dimensions:
+            if dim in filters:
+                unknown = [value for value in filters[dim] if value not in self._positions[dim]]
+                if unknown:
+                    raise ValueError(f"Unknown {dim} value(s): {', '.join(unknown)}")
+                selections.append(sorted({self._positions[dim][value] for value in filters[dim]}))
+            else:
+                selections.append(range(len(self.levels[dim])))
+        selected = self.counts[np.ix_(*selections)]
+
+        # Roll up every axis that is not grouped by; income stays for the rates
+        with_rates = 'income' not in group_by
+        keep = [self.dimensions.index(dim) for dim in group_by]
+        if with_rates:
+            keep.append(self.dimensions.index('income'))
+        rolled = selected.sum(axis=tuple(axis for axis in range(selected.ndim) if axis not in keep))
+        # The remaining axes are in cube order; put them in the caller's order
+        rolled = np.moveaxis(rolled, [sorted(keep).index(axis) for axis in keep], range(len(keep)))
+
+        group_labels = [[self.levels[dim][i] for i in selections[self.dimensions.index(dim)]]
+                        for dim in group_by]
+        income_labels = [self.levels['income'][i] for i in selections[self.dimensions.index('income')]]
+        rows = []
+        for index in np.ndindex(*rolled.shape[:len(group_by)]):
+            counts = rolled[index]
+            count = int(counts.sum())
+            if count == 0:
+                continue
+            row = {dim: group_labels[k][index[k]] for k, dim in enumerate(group_by)}
+            row['count'] = count
+            if with_rates:
+                high = int(counts[income_labels.index(HIGH_INCOME)]) if HIGH_INCOME in income_labels else 0
+                row['high_income'] = high
+                row['high_income_rate'] = round(100 * high / count, 2)
+            rows.append(row)
+        return rows
+
+
+def load_cube(csv_path=DEFAULT_CSV_PATH, cube_path=DEFAULT_CUBE_PATH):
+    """Return the data cube, rebuilding it only when the CSV's hash has changed"""
+    csv_sha256 = file_sha256(csv_path)
+    if os.path.exists(cube_path):
+        try:
+            cube = DataCube.load(cube_path)
+            if cube.csv_sha256 == csv_sha256:
+                return cube
+        except Exception as e:
+            logger.warning("Ignoring unreadable data cube %s: %s", cube_path, e)
+
+    logger.info("Building data cube for %s", csv_path)
+    columns = [col for col in DIMENSIONS if col != 'age_group'] + ['age']
+    cube = DataCube.build(load_dataset(csv_path, columns=columns), csv_sha256)
+    cube.save(cube_path)
+    return cube
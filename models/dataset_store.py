@@ -0,0 +1,180 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from models.registry import file_sha256
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CSV_PATH = 'adult.csv'
+DEFAULT_CACHE_DIR = 'cache/adult'
+
+# Smallest integer dtypes tried, in order, for whole-number numeric columns
+INT_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def _code_dtype(n_categories):
+    for dtype in INT_DTYPES:
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _compact_numeric(values):
+    """values as the smallest int dtype that holds them, or unchanged if not whole numbers"""
+    if values.dtype.kind not in 'iu' or len(values) == 0:
+        return values
+    low, high = values.min(), values.max()
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _write_atomic(path, write, mode='wb'):
+    """Write path through a temporary file of this call's own, renamed into place, so
+    concurrent builders never write to each other's files"""
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        # mkstemp makes the file private; keep the cache as readable as open() would
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_npy(path, values):
+    _write_atomic(path, lambda f: np.save(f, values))
+
+
+def _write_meta(cache_dir, meta):
+    _write_atomic(os.path.join(cache_dir, 'current.json'),
+                  lambda f: json.dump(meta, f, indent=2), mode='w')
+
+
+def build_dataset_cache(csv_path=DEFAULT_CSV_PATH, cache_dir=DEFAULT_CACHE_DIR, csv_sha256=None):
+    """Parse csv_path once and store it as one .npy file per column.
+
+    Text columns are dictionary-encoded: their sorted distinct values go in the
+    metadata and the column holds small integer codes (-1 for missing). Integer
+    columns are narrowed to the smallest dtype that fits. Each build goes in its own
+    directory named after the CSV hash and current.json is switched to it last, so
+    readers never see a half-written cache. The file is read once, so the recorded
+    size and row count describe the same bytes even if rows are being appended.
+    """
+    start = time.perf_counter()
+    with open(csv_path, 'rb') as f:
+        content = f.read()
+    csv_sha256 = csv_sha256 or hashlib.sha256(content).hexdigest()
+    stat = os.stat(csv_path)
+    df = pd.read_csv(io.BytesIO(content))
+
+    version = csv_sha256[:16]
+    build_dir = os.path.join(cache_dir, version)
+    os.makedirs(build_dir, exist_ok=True)
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        filename = f'{i:02d}.npy'
+        if pd.api.types.is_numeric_dtype(series):
+            values = _compact_numeric(series.to_numpy())
+            columns.append({'name': name, 'file': filename, 'kind': 'numeric',
+                            'dtype': values.dtype.name})
+        else:
+            categories = sorted(series.dropna().unique().tolist())
+            codes = pd.Categorical(series, categories=categories).codes
+            values = codes.astype(_code_dtype(len(categories)))
+            columns.append({'name': name, 'file': filename, 'kind': 'category',
+                            'dtype': values.dtype.name, 'categories': categories})
+        _write_npy(os.path.join(build_dir, filename), values)
+
+    meta = {
+        'csv_path': csv_path,
+        'csv_sha256': csv_sha256,
+        'csv_size': len(content),
+        'csv_mtime': stat.st_mtime,
+        'version': version,
+        'rows': len(df),
+        'columns': columns,
+        'build_seconds': round(time.perf_counter() - start, 3),
+    }
+    _write_meta(cache_dir, meta)
+
+    # Earlier builds are no longer referenced
+    for entry in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, entry)
+        if entry != version and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    return meta
+
+
+def _current_meta(csv_path, cache_dir):
+    """Metadata of the cache if it was built from the CSV as it is now, else None"""
+    try:
+        with open(os.path.join(cache_dir, 'current.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(csv_path)
+    if meta['csv_size'] != stat.st_size:
+        return None
+    if meta['csv_mtime'] != stat.st_mtime:
+        if meta['csv_sha256'] != file_sha256(csv_path):
+            return None
+        # Touched or copied but unchanged: store the new mtime so later loads
+        # don't hash the file again
+        meta['csv_mtime'] = stat.st_mtime
+        _write_meta(cache_dir, meta)
+    return meta
+
+
+def load_dataset(csv_path=DEFAULT_CSV_PATH, columns=None, as_category=True,
+                 cache_dir=DEFAULT_CACHE_DIR, return_meta=False):
+    """Load the dataset from its columnar cache, rebuilding the cache if the CSV changed.
+
+    Text columns come back as pandas categoricals and numeric columns as compact
+    ints, memory-mapped from the cache. Pass columns to load only some of them, and
+    as_category=False to get the dtypes pd.read_csv would give: text columns as
+    plain strings and integer columns as int64. With return_meta=True, also returns
+    the cache metadata, whose rows and csv_size give the part of the CSV loaded.
+    """
+    meta = _current_meta(csv_path, cache_dir)
+    if meta is None:
+        logger.info("Building columnar cache for %s", csv_path)
+        meta = build_dataset_cache(csv_path, cache_dir)
+
+    by_name = {column['name']: column for column in meta['columns']}
+    names = list(by_name) if columns is None else list(columns)
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise KeyError(f"Columns not in {csv_path}: {missing}")
+
+    data = {}
+    for name in names:
+        column = by_name[name]
+        values = np.load(os.path.join(cache_dir, meta['version'], column['file']), mmap_mode='r')
+        if column['kind'] == 'category':
+            values = pd.Categorical.from_codes(values, categories=column['categories'])
+            if not as_category:
+                values = np.asarray(values, dtype=object)
+        elif not as_category and values.dtype.kind in 'iu':
+            values = values.astype(np.int64)
+        data[name] = values
+    df = pd.DataFrame(data, columns=names)
+    if return_meta:
+        return df, meta
+    return df
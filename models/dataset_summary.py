@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+import joblib
+import pandas as pd
+
+from models.dataset_store import load_dataset
+from models.registry import file_sha256
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CSV_PATH = 'adult.csv'
+DEFAULT_SUMMARY_PATH = 'cache/dataset_summary.pkl'
+# Bump when build_summary's output changes meaning, so cached summaries are rebuilt.
+# 2: age groups are left-closed
+SUMMARY_VERSION = 2
+
+CATEGORICAL_COLUMNS = ['workclass', 'education', 'marital-status', 'occupation',
+                       'relationship', 'race', 'gender', 'native-country', 'income']
+NUMERIC_COLUMNS = ['age', 'fnlwgt', 'educational-num', 'capital-gain',
+                   'capital-loss', 'hours-per-week']
+
+AGE_BINS = [16, 25, 35, 45, 55, 65, 100]
+AGE_LABELS = ['<25', '25-34', '35-44', '45-54', '55-64', '65+']
+
+# Crosstabs of raw counts: name -> (row columns, column)
+CROSSTABS = {
+    'education_income': (['education'], 'income'),
+    'occupation_income': (['occupation'], 'income'),
+    'age_group_income': (['age_group'], 'income'),
+    'gender_income': (['gender'], 'income'),
+    'gender_education_income': (['gender', 'education'], 'income'),
+    'occupation_gender': (['occupation'], 'gender'),
+}
+
+
+def add_age_group(df):
+    # Left-closed bins, so '35-44' holds ages 35 to 44 as its label says
+    df['age_group'] = pd.cut(df['age'], bins=AGE_BINS, labels=AGE_LABELS, right=False)
+    return df
+
+
+def build_summary(df, csv_sha256=None):
+    """One pass over the dataset computing every aggregate the app and charts use"""
+    df = add_age_group(df.copy())
+    numeric = [col for col in NUMERIC_COLUMNS if col in df.columns]
+    return {
+        'csv_sha256': csv_sha256,
+        'version': SUMMARY_VERSION,
+        'built_at': datetime.now(timezone.utc).isoformat(),
+        'rows': len(df),
+        'value_counts': {col: df[col].value_counts()
+                         for col in CATEGORICAL_COLUMNS if col in df.columns},
+        'crosstabs': {name: pd.crosstab([df[col] for col in rows], df[column])
+                      for name, (rows, column) in CROSSTABS.items()},
+        'numeric': df[numeric].describe(),
+        'numeric_by_income': df.groupby('income', observed=True)[numeric].mean(),
+    }
+
+
+def load_summary(csv_path=DEFAULT_CSV_PATH, summary_path=DEFAULT_SUMMARY_PATH):
+    """Return the dataset summary, rebuilding it only when the CSV's hash or SUMMARY_VERSION has changed"""
+    csv_sha256 = file_sha256(csv_path)
+    if os.path.exists(summary_path):
+        try:
+            summary = joblib.load(summary_path)
+            if (summary.get('csv_sha256') == csv_sha256
+                    and summary.get('version') == SUMMARY_VERSION):
+                return summary
+        except Exception as e:
+            logger.warning("Ignoring unreadable dataset summary %s: %s", summary_path, e)
+
+    logger.info("Building dataset summary for %s", csv_path)
+    summary = build_summary(load_dataset(csv_path), csv_sha256)
+    os.makedirs(os.path.dirname(summary_path) or '.', exist_ok=True)
+    tmp_path = summary_path + '.tmp'
+    joblib.dump(summary, tmp_path, compress=3)
+    os.replace(tmp_path, summary_path)
+    return summary
+
+
+def row_percent(crosstab):
+    """Crosstab counts as percentages of each row, like pd.crosstab(normalize='index') * 100"""
+    return crosstab.div(crosstab.sum(axis=1), axis=0) * 100
+
+
+def income_rate(crosstab):
+    """Percentage of each row of an income crosstab earning >50K"""
+    return row_percent(crosstab)['>50K']
+
+
+def summary_to_json(summary):
+    """JSON-friendly form of a summary for the /api/stats endpoint"""
+    crosstabs = {}
+    for name, table in summary['crosstabs'].items():
+        entry = json.loads(table.to_json(orient='split'))
+        entry['counts'] = entry.pop('data')
+        if name.endswith('_income'):
+            entry['income_rate'] = income_rate(table).round(2).tolist()
+        crosstabs[name] = entry
+    return {
+        'csv_sha256': summary['csv_sha256'],
+        'built_at': summary['built_at'],
+        'rows': summary['rows'],
+        'value_counts': {col: json.loads(counts.to_json())
+                         for col, counts in summary['value_counts'].items()},
+        'crosstabs': crosstabs,
+        'numeric': json.loads(summary['numeric'].to_json()),
+        'numeric_by_income': json.loads(summary['numeric_by_income'].to_json(orient='index')),
+    }
@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from models.model_utils import FEATURE_ORDER
+
+logger = logging.getLogger(__name__)
+
+DRIFT_REFERENCE_PATH = 'models/drift_reference.json'
+
+# Quantile bins per numeric feature in the reference sketch
+REFERENCE_BINS = 10
+# Distinct categories kept per categorical feature; rarer ones share one slot
+MAX_CATEGORIES = 64
+OTHER = '(other)'
+
+# Population stability index bands
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# Rows needed in the window before a feature is scored
+MIN_SAMPLES = 100
+
+
+def build_reference(X):
+    """Reference sketches of every FEATURE_ORDER column of raw training rows.
+
+    Numeric features get bins at the training data's deciles, categorical features
+    their most common categories plus one slot for everything else. Serving counts
+    requests into the same bins, so each sketch is a fixed-length count vector.
+    """
+    features = {}
+    for col in FEATURE_ORDER:
+        values = X[col]
+        if pd.api.types.is_numeric_dtype(values):
+            numeric = values.to_numpy(dtype=np.float64)
+            edges = np.unique(np.quantile(numeric, np.linspace(0, 1, REFERENCE_BINS + 1)[1:-1]))
+            counts = np.bincount(np.searchsorted(edges, numeric, side='right'),
+                                 minlength=len(edges) + 1)
+            features[col] = {'kind': 'numeric', 'edges': edges.tolist(), 'counts': counts.tolist()}
+        else:
+            value_counts = values.astype(str).value_counts()
+            categories = value_counts.index[:MAX_CATEGORIES].tolist()
+            counts = value_counts.iloc[:MAX_CATEGORIES].tolist() + [int(value_counts.iloc[MAX_CATEGORIES:].sum())]
+            features[col] = {'kind': 'categorical', 'categories': categories,
+                             'counts': [int(c) for c in counts]}
+    return {'rows': len(X), 'features': features}
+
+
+def extend_reference(reference, X):
+    """Add raw rows to reference sketches, counted into the sketches' existing bins"""
+    features = {}
+    for col, sketch in reference['features'].items():
+        counts = np.array(sketch['counts'], dtype=np.int64)
+        if sketch['kind'] == 'numeric':
+            values = pd.to_numeric(X[col], errors='coerce').to_numpy(dtype=np.float64)
+            values = values[~np.isnan(values)]
+            bins = np.searchsorted(np.array(sketch['edges']), values, side='right')
+        else:
+            positions = {category: i for i, category in enumerate(sketch['categories'])}
+            bins = np.array([positions.get(value, len(positions)) for value in X[col].astype(str)],
+                            dtype=np.int64)
+        counts += np.bincount(bins, minlength=len(counts))
+        features[col] = dict(sketch, counts=counts.tolist())
+    return {'rows': reference['rows'] + len(X), 'features': features}
+
+
+def save_reference(reference, path=DRIFT_REFERENCE_PATH):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(reference, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_reference(path=DRIFT_REFERENCE_PATH):
+    """The saved reference sketches, or None if the model was trained without them"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def psi(expected, actual, epsilon=1e-4):
+    """Population stability index between two count vectors over the same bins"""
+    expected = np.maximum(expected / expected.sum(), epsilon)
+    actual = np.maximum(actual / actual.sum(), epsilon)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks(expected, actual):
+    """Largest gap between the two binned CDFs, a binned Kolmogorov-Smirnov statistic"""
+    return float(np.max(np.abs(np.cumsum(expected) / expected.sum()
+                               - np.cumsum(actual) / actual.sum())))
+
+
+class DriftMonitor:
+    """Rolling-window input drift against the training data's reference sketches.
+
+    observe() only puts records on a queue, so the request path never waits on the
+    monitor. At most max_queued_rows rows wait on it: a frame larger than the room
+    left is replaced by a random sample that fits, and the rows left out, like rows
+    that could not be binned, are counted in dropped. A background thread bins
+    queued records into the current time bucket. The window
+    is a ring of `buckets` count vectors per feature, each covering an equal slice
+    of window_seconds, so memory stays constant however much traffic arrives.
+
+    Threads don't survive fork, so each worker process starts its own on first use
+    and keeps its own window.
+    """
+
+    def __init__(self, reference, window_seconds=3600, buckets=12, max_queued_rows=10000):
+        self.window_seconds = window_seconds
+        self.n_buckets = buckets
+        self.max_queued_rows = max_queued_rows
+        self._lock = threading.Lock()
+        self._queue = None
+        self._queued_rows = 0
+        self._pid = None
+        self.dropped = 0
+        self.set_reference(reference)
+
+    def set_reference(self, reference):
+        """Switch to new reference sketches, emptying the window"""
+        with self._lock:
+            self.reference = reference
+            features = reference['features'] if reference else {}
+            self._positions = {col: {category: i for i, category in enumerate(sketch['categories'])}
+                               for col, sketch in features.items() if sketch['kind'] == 'categorical'}
+            self._edges = {col: np.array(sketch['edges']) for col, sketch in features.items()
+                           if sketch['kind'] == 'numeric'}
+            self._windows = {col: np.zeros((self.n_buckets, len(sketch['counts'])), dtype=np.int64)
+                             for col, sketch in features.items()}
+            self._bucket_ids = np.full(self.n_buckets, -1, dtype=np.int64)
+
+    @property
+    def enabled(self):
+        return self.reference is not None
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._queued_rows = 0
+                threading.Thread(target=self._run, args=(self._queue,),
+                                 name='drift-monitor', daemon=True).start()
+                self._pid = os.getpid()
+
+    def observe(self, records):
+        """Queue a dict or DataFrame of raw records for the window; never blocks"""
+        if not self.enabled:
+            return
+        self._ensure_worker()
+        rows = 1 if isinstance(records, dict) else len(records)
+        with self._lock:
+            kept = min(rows, max(self.max_queued_rows - self._queued_rows, 0))
+            self._queued_rows += kept
+            self.dropped += rows - kept
+        if kept == 0:
+            return
+        if kept < rows:
+            records = records.sample(n=kept)
+        self._queue.put_nowait(records)
+
+    def _run(self, pending):
+        while True:
+            items = [pending.get()]
+            while True:
+                try:
+                    items.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            rows = sum(1 if isinstance(item, dict) else len(item) for item in items)
+            frames = [item for item in items if isinstance(item, pd.DataFrame)]
+            records = [item for item in items if isinstance(item, dict)]
+            if records:
+                frames.append(pd.DataFrame(records))
+            try:
+                self._add(pd.concat(frames, ignore_index=True))
+            except Exception:
+                # A malformed record must not stop monitoring, but its batch is lost
+                logger.exception("Drift monitor could not bin %d queued rows", rows)
+                with self._lock:
+                    self.dropped += rows
+            finally:
+                with self._lock:
+                    self._queued_rows -= rows
+
+    def _bucket(self, now):
+        """Row of the ring for the current time slice, cleared if it held an old slice"""
+        bucket_id = int(now // (self.window_seconds / self.n_buckets))
+        row = bucket_id % self.n_buckets
+        if self._bucket_ids[row] != bucket_id:
+            for window in self._windows.values():
+                window[row] = 0
+            self._bucket_ids[row] = bucket_id
+        return row
+
+    def _add(self, frame):
+        binned = {}
+        for col, edges in self._edges.items():
+            if col in frame:
+                values = pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=np.float64)
+                values = values[~np.isnan(values)]
+                binned[col] = np.searchsorted(edges, values, side='right')
+        for col, positions in self._positions.items():
+            if col in frame:
+                other = len(positions)
+                binned[col] = np.array([positions.get(str(value), other) for value in frame[col]],
+                                       dtype=np.int64)
+        with self._lock:
+            row = self._bucket(time.time())
+            for col, bins in binned.items():
+                window = self._windows[col]
+                window[row] += np.bincount(bins, minlength=window.shape[1])
+
+    def _window_counts(self, now):
+        """Counts per feature over the buckets still inside the window"""
+        current = int(now // (self.window_seconds / self.n_buckets))
+        live = (self._bucket_ids > current - self.n_buckets) & (self._bucket_ids >= 0)
+        return {col: window[live].sum(axis=0) for col, window in self._windows.items()}
+
+    def report(self):
+        """PSI (and KS for numeric features) of the window against the reference"""
+        if not self.enabled:
+            return {'enabled': False}
+        with self._lock:
+            counts = self._window_counts(time.time())
+            dropped = self.dropped
+        features = {}
+        for col, sketch in self.reference['features'].items():
+            actual = counts[col]
+            expected = np.array(sketch['counts'], dtype=np.float64)
+            entry = {'kind': sketch['kind'], 'samples': int(actual.sum())}
+            if actual.sum() < MIN_SAMPLES:
+                entry['status'] = 'insufficient_data'
+            else:
+                entry['psi'] = round(psi(expected, actual), 4)
+                if sketch['kind'] == 'numeric':
+                    entry['ks'] = round(ks(expected, actual), 4)
+                else:
+                    entry['unseen_share'] = round(float(actual[-1] / actual.sum()), 4)
+                entry['status'] = ('significant' if entry['psi'] >= PSI_SIGNIFICANT else
+                                   'moderate' if entry['psi'] >= PSI_MODERATE else 'stable')
+            features[col] = entry
+        drifted = sorted(col for col, entry in features.items() if entry['status'] == 'significant')
+        return {
+            'enabled': True,
+            'window_seconds': self.window_seconds,
+            'reference_rows': self.reference['rows'],
+            'dropped': dropped,
+            'drifted_features': drifted,
+            'features': features,
+        }
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+
+from models.forest_export import ArrayForest, DEFAULT_FOREST_DIR
+from models.model_utils import FEATURE_ORDER
+
+
+def load_explainer(model, model_sha256=None, forest_dir=DEFAULT_FOREST_DIR):
+    """The ArrayForest that can explain model's predictions, or None.
+
+    An ArrayForest with decision paths explains itself. A pickled forest is paired
+    with the export written alongside it, checked through the export's record of
+    the pickle's hash so explanations never come from a different model.
+    """
+    if isinstance(model, ArrayForest):
+        return model if model.has_paths else None
+    if not os.path.exists(os.path.join(forest_dir, 'meta.json')):
+        return None
+    forest = ArrayForest(forest_dir)
+    if not forest.has_paths:
+        return None
+    if model_sha256 is not None and forest.meta.get('source_sha256') != model_sha256:
+        return None
+    return forest
+
+
+def feature_names(explainer):
+    return explainer.feature_names or FEATURE_ORDER[:explainer.n_features_in_]
+
+
+def explain_scored(explainer, scored_rows, scored, n_rows):
+    """Contributions for the rows score_frame scored, from the preprocessed rows and
+    positions it returns with return_processed=True.
+
+    The other rows get NaN, so the result has n_rows rows lining up with the frame.
+    """
+    contributions = np.full((n_rows, explainer.n_features_in_), np.nan)
+    base_value = None
+    if len(scored):
+        base_value, contributions[scored] = explainer.contributions(scored_rows)
+    return base_value, contributions
+
+
+def explanation_json(base_value, contributions, names):
+    """One row's explanation, features ordered by the size of their contribution.
+
+    model_probability is base_value plus the contributions: the forest's own >50K
+    probability, before any calibration.
+    """
+    order = np.argsort(-np.abs(contributions), kind='stable')
+    return {
+        'base_value': round(float(base_value), 4),
+        'model_probability': round(float(base_value + contributions.sum()), 4),
+        'contributions': [{'feature': names[i], 'contribution': round(float(contributions[i]), 4)}
+                          for i in order],
+    }
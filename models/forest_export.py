@@ -0,0 +1,276 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+DEFAULT_FOREST_DIR = 'models/income_predictor_forest'
+FORMAT_VERSION = 1
+
+# Rows scored per block, bounds the (rows x trees) node index matrix
+BLOCK_ROWS = 8192
+
+_ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+# Decision-path arrays for explanations; exports made before these existed lack them
+_PATH_ARRAYS = ['parent', 'path_feature', 'delta']
+
+
+def _save_array(directory, name, array):
+    with open(os.path.join(directory, f'{name}.npy'), 'wb') as f:
+        np.save(f, np.ascontiguousarray(array))
+
+
+def _current_arrays(directory):
+    """The arrays subdirectory named by directory's meta.json, '' for exports that
+    keep their arrays next to it, or None if there is no readable export"""
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f).get('arrays', '')
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_old_versions(directory, keep):
+    """Delete array versions, unfinished exports and loose arrays not in keep"""
+    for entry in os.scandir(directory):
+        if entry.is_dir() and entry.name.lstrip('.').startswith('v') and entry.name not in keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.name.endswith('.npy') and '' not in keep:
+            os.remove(entry.path)
+
+
+def node_depths(tree):
+    """Depth of every node in a fitted sklearn tree (the root is 0)"""
+    depth = np.zeros(tree.node_count, dtype=np.int64)
+    level, current = np.array([0]), 0
+    while len(level):
+        internal = level[tree.children_left[level] != -1]
+        level = np.concatenate([tree.children_left[internal], tree.children_right[internal]])
+        current += 1
+        depth[level] = current
+    return depth
+
+
+def round_down_float32(threshold):
+    """The largest float32 <= each float64 threshold.
+
+    Features are compared as float32, and for any float32 x, x <= t exactly when
+    x <= round_down_float32(t), so storing these thresholds changes no split.
+    """
+    rounded = threshold.astype(np.float32)
+    over = rounded.astype(np.float64) > threshold
+    rounded[over] = np.nextafter(rounded[over], np.float32(-np.inf))
+    return rounded
+
+
+def export_forest(model, directory=DEFAULT_FOREST_DIR, source_sha256=None, n_trees=None,
+                  max_depth=None, compact=False, compression=None):
+    """Flatten a fitted RandomForestClassifier into contiguous arrays on disk.
+
+    All trees are concatenated into one node table. Leaves point to themselves and
+    hold each tree's normalized class probabilities, so prediction is a fixed number
+    of gather steps. For explanations every node also records its parent, the
+    feature its parent split on, and how much entering it changed the probability of
+    the explained class (the last class, >50K).
+
+    The arrays go into a new version subdirectory, renamed into place once complete,
+    and meta.json, which names the version, is replaced last. Loaders read meta.json
+    first, so they never pair it with another export's arrays. The previous version
+    is kept for loaders still reading it; older ones are deleted.
+
+    n_trees keeps only the first trees and max_depth turns the nodes at that depth
+    into leaves predicting their own class mix, dropping everything below. compact
+    stores thresholds as float32 (rounded so no split changes), probabilities as
+    float32 and feature indices as int8 where they fit. compression is recorded in
+    meta.json as is.
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    parents, path_features, deltas = [], [], []
+    explained = len(model.classes_) - 1
+    offset = 0
+    forest_depth = 0
+    for estimator in model.estimators_[:n_trees]:
+        tree = estimator.tree_
+        depth = node_depths(tree)
+        keep = depth <= max_depth if max_depth is not None else np.ones(tree.node_count, dtype=bool)
+        # Nodes stay in depth-first order, renumbered over the ones kept
+        new_ids = np.cumsum(keep) - 1
+        n_nodes = int(keep.sum())
+        is_leaf = (tree.children_left == -1)[keep]
+        if max_depth is not None:
+            is_leaf |= depth[keep] == max_depth
+        node_ids = np.arange(n_nodes)
+
+        left = np.where(is_leaf, node_ids, new_ids[tree.children_left[keep]]) + offset
+        right = np.where(is_leaf, node_ids, new_ids[tree.children_right[keep]]) + offset
+        feature = np.where(is_leaf, 0, tree.feature[keep])
+        threshold = np.where(is_leaf, np.inf, tree.threshold[keep])
+
+        # Same normalization as DecisionTreeClassifier.predict_proba
+        value = tree.value[keep, 0, :].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        value = value / normalizer
+
+        # Roots are their own parent with no change, so walking up past them adds nothing
+        parent = node_ids.copy()
+        parent[left[~is_leaf] - offset] = node_ids[~is_leaf]
+        parent[right[~is_leaf] - offset] = node_ids[~is_leaf]
+        path_feature = np.where(parent == node_ids, 0, feature[parent])
+        delta = value[:, explained] - value[parent, explained]
+
+        features.append(feature.astype(np.int32))
+        thresholds.append(threshold.astype(np.float64))
+        lefts.append(left.astype(np.int32))
+        rights.append(right.astype(np.int32))
+        values.append(value)
+        roots.append(offset)
+        parents.append((parent + offset).astype(np.int32))
+        path_features.append(path_feature.astype(np.int32))
+        deltas.append(delta)
+        offset += n_nodes
+        forest_depth = max(forest_depth, int(depth[keep].max()))
+
+    arrays = {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values),
+        'roots': np.array(roots, dtype=np.int32),
+        'parent': np.concatenate(parents),
+        'path_feature': np.concatenate(path_features),
+        'delta': np.concatenate(deltas),
+    }
+    if compact:
+        index_dtype = np.int8 if model.n_features_in_ <= np.iinfo(np.int8).max else np.int16
+        arrays['threshold'] = round_down_float32(arrays['threshold'])
+        arrays['value'] = arrays['value'].astype(np.float32)
+        arrays['delta'] = arrays['delta'].astype(np.float32)
+        arrays['feature'] = arrays['feature'].astype(index_dtype)
+        arrays['path_feature'] = arrays['path_feature'].astype(index_dtype)
+    os.makedirs(directory, exist_ok=True)
+    previous = _current_arrays(directory)
+    version = f'v{time.time_ns()}'
+    tmp_dir = os.path.join(directory, f'.{version}.tmp')
+    os.makedirs(tmp_dir)
+    for name in _ARRAYS + _PATH_ARRAYS:
+        _save_array(tmp_dir, name, arrays[name])
+    os.replace(tmp_dir, os.path.join(directory, version))
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'n_trees': len(roots),
+        'n_nodes': int(offset),
+        'n_features': int(model.n_features_in_),
+        'max_depth': forest_depth,
+        'classes': [c.item() if hasattr(c, 'item') else c for c in model.classes_],
+        'feature_names': [str(name) for name in getattr(model, 'feature_names_in_', [])],
+        'source_sha256': source_sha256,
+        'arrays': version,
+    }
+    if compression is not None:
+        meta['compression'] = compression
+    meta_path = os.path.join(directory, 'meta.json')
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + '.tmp', meta_path)
+    _remove_old_versions(directory, {version, previous})
+    return meta
+
+
+class ArrayForest:
+    """Pure-NumPy forest predictor over memory-mapped node arrays.
+
+    Exposes the predict/predict_proba/classes_ subset of RandomForestClassifier that
+    the app uses. Arrays are opened with mmap_mode='r', so processes loading the same
+    files share one page-cached copy. Results match sklearn exactly: features are
+    compared as float32 like sklearn's trees, and per-tree probabilities are summed
+    in tree order before averaging.
+    """
+
+    def __init__(self, directory=DEFAULT_FOREST_DIR, mmap_mode='r'):
+        start = time.perf_counter()
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported forest format: {self.meta.get('format_version')}")
+        # Older exports keep their arrays next to meta.json
+        self.array_dir = os.path.join(directory, self.meta.get('arrays', ''))
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(self.array_dir, f'{name}.npy'),
+                                        mmap_mode=mmap_mode))
+        self.has_paths = all(os.path.exists(os.path.join(self.array_dir, f'{name}.npy'))
+                             for name in _PATH_ARRAYS)
+        if self.has_paths:
+            for name in _PATH_ARRAYS:
+                setattr(self, name, np.load(os.path.join(self.array_dir, f'{name}.npy'),
+                                            mmap_mode=mmap_mode))
+        self.feature_names = self.meta.get('feature_names') or None
+        self.classes_ = np.array(self.meta['classes'])
+        self.n_features_in_ = self.meta['n_features']
+        self.n_estimators = self.meta['n_trees']
+        self.directory = directory
+        self.load_seconds = time.perf_counter() - start
+
+    def apply(self, X):
+        """Return the global leaf index reached in every tree, shape (rows, trees)"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got shape {X.shape}")
+        rows = np.arange(len(X))[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.meta['max_depth']):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        proba = np.zeros((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), BLOCK_ROWS):
+            leaves = self.apply(X[start:start + BLOCK_ROWS])
+            block = proba[start:start + BLOCK_ROWS]
+            for tree in range(leaves.shape[1]):
+                block += self.value[leaves[:, tree]]
+        proba /= self.n_estimators
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def contributions(self, X):
+        """Per-feature contributions to the probability of the last class (>50K).
+
+        Each tree's path from root to leaf is walked back up, crediting every change
+        in probability to the feature split on at that step (the Saabas method), and
+        the credits are averaged over trees. Returns (base_value, contributions) with
+        contributions of shape (rows, features); for every row base_value plus the
+        row's contributions equals predict_proba's last column.
+        """
+        if not self.has_paths:
+            raise ValueError(f"{self.directory} was exported without decision paths; "
+                             "re-run train_model.py to explain predictions")
+        X = np.asarray(X, dtype=np.float32)
+        n_features = self.n_features_in_
+        out = np.zeros((len(X), n_features), dtype=np.float64)
+        for start in range(0, len(X), BLOCK_ROWS):
+            nodes = self.apply(X[start:start + BLOCK_ROWS])
+            n_rows = len(nodes)
+            row_offsets = (np.arange(n_rows) * n_features)[:, np.newaxis]
+            totals = np.zeros(n_rows * n_features, dtype=np.float64)
+            for _ in range(self.meta['max_depth']):
+                totals += np.bincount((row_offsets + self.path_feature[nodes]).ravel(),
+                                      weights=self.delta[nodes].ravel(),
+                                      minlength=n_rows * n_features)
+                nodes = self.parent[nodes]
+            out[start:start + n_rows] = totals.reshape(n_rows, n_features)
+        out /= self.n_estimators
+        base_value = float(self.value[self.roots, -1].mean())
+        return base_value, out
+
+
+def load_array_forest(meta_path):
+    """ModelRegistry loader: takes the path of meta.json in an exported forest"""
+    return ArrayForest(os.path.dirname(meta_path))
@@ -0,0 +1,305 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from models.model_utils import preprocess_data
+
+logger = logging.getLogger(__name__)
+
+# How many distinct values of a numeric column to probe before deciding whether
+# preprocess_data maps it affinely (scaled, shifted or unchanged)
+AFFINE_PROBES = 8
+# Leading rows of a batch tried when looking for one preprocess_data accepts
+BASE_CANDIDATES = 32
+
+
+def _fit_affine(probed):
+    """(slope, intercept) if every probed output is slope * value + intercept, else None"""
+    try:
+        values = np.array(list(probed), dtype=np.float64)
+        outputs = np.array(list(probed.values()), dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    if (outputs == values).all():
+        return 1.0, 0.0
+    lo, hi = values.argmin(), values.argmax()
+    if values[lo] == values[hi]:
+        return None
+    slope = (outputs[hi] - outputs[lo]) / (values[hi] - values[lo])
+    intercept = outputs[lo] - slope * values[lo]
+    if np.allclose(values * slope + intercept, outputs, rtol=1e-9, atol=1e-12):
+        return float(slope), float(intercept)
+    return None
+
+
+class FramePreprocessor:
+    """Columnar version of preprocess_data for whole DataFrames.
+
+    preprocess_data encodes one record at a time with the preprocessors fitted by
+    train_preprocessors. Each feature is encoded on its own, so instead of calling it
+    once per row we call it once per distinct value, record what every column maps to,
+    and then encode whole columns with vectorized lookups. Numeric columns that
+    preprocess_data only scales or shifts are computed with that affine map instead
+    of being tabulated value by value. Rows containing newly learned values are
+    sampled and checked against the row path, and anything that can't be compiled
+    falls back to it, so the output is the same as calling preprocess_data row by
+    row (to within float rounding for scaled columns).
+
+    Values are probed by substituting them into one base record that preprocess_data
+    accepts, so a value that fails is rejected on its own account and can be cached
+    as invalid. One instance can be shared between threads.
+
+    The learned tables are only valid for one set of fitted preprocessors; create a new
+    instance after train_preprocessors runs again. Pass the CategoryExtensions saved by
+    incremental training to encode categories added since then.
+    """
+
+    def __init__(self, preprocess=preprocess_data, verify_rows=16, random_state=0,
+                 extensions=None):
+        self._preprocess = preprocess
+        self.extensions = extensions
+        self.verify_rows = verify_rows
+        self._rng = np.random.default_rng(random_state)
+        self._lock = threading.Lock()
+        self.columns = None
+        self.dtypes = None
+        self.compiled = True
+        self._base = None
+        # Replaced, never mutated, once published, so readers need no lock
+        self._maps = {}
+        self._affine = {}
+        self._errors = {}
+        # Numeric columns seen with too few distinct values to fit an affine map
+        self._undecided = set()
+
+    def _run_row(self, record):
+        return self._preprocess(record).iloc[0]
+
+    def _find_base(self, df):
+        """Learn the output schema from the first leading row preprocess_data accepts"""
+        for record in df.iloc[:BASE_CANDIDATES].to_dict('records'):
+            try:
+                out = self._preprocess(record)
+            except Exception:
+                continue
+            self._base = record
+            self.columns = list(out.columns)
+            self.dtypes = out.dtypes.to_dict()
+            return True
+        return False
+
+    def _probe(self, column_values, maps, errors):
+        """Run preprocess_data over probe records that cycle through the given values"""
+        n_probes = max(len(values) for values in column_values.values())
+        for i in range(n_probes):
+            record = dict(self._base)
+            for col, values in column_values.items():
+                record[col] = values[i % len(values)]
+            try:
+                out = self._run_row(record)
+            except Exception:
+                # One of the values is rejected; probe them one at a time to find it
+                self._probe_one_by_one(column_values, i, maps, errors)
+                continue
+            for col, values in column_values.items():
+                maps.setdefault(col, {})[values[i % len(values)]] = out[col]
+
+    def _probe_one_by_one(self, column_values, i, maps, errors):
+        for col, values in column_values.items():
+            value = values[i % len(values)]
+            if value in maps.get(col, {}) or (col, value) in errors:
+                continue
+            record = dict(self._base)
+            record[col] = value
+            try:
+                maps.setdefault(col, {})[value] = self._run_row(record)[col]
+            except Exception as e:
+                # The base record is accepted, so the failure belongs to this value
+                errors[(col, value)] = e
+
+    def _compile(self, df):
+        """Learn every value of df not seen before; call with the lock held.
+
+        Returns {column: values} learned from this batch, or None if df has no row
+        preprocess_data accepts to probe with.
+        """
+        if self._base is None:
+            if not self._find_base(df):
+                return None
+            if not set(self.columns) <= set(df.columns):
+                # Output columns aren't a per-feature encoding of the input
+                self.compiled = False
+                return None
+
+        maps = {col: dict(table) for col, table in self._maps.items()}
+        affine = dict(self._affine)
+        errors = dict(self._errors)
+        learned = {}
+
+        # Decide which numeric columns preprocess_data maps affinely
+        undecided = [col for col in self.columns
+                     if col not in affine and (col not in maps or col in self._undecided)
+                     and pd.api.types.is_numeric_dtype(df[col])]
+        if undecided:
+            samples = {}
+            for col in undecided:
+                values = [v for v in pd.unique(df[col].dropna())
+                          if v not in maps.get(col, {}) and (col, v) not in errors]
+                if values:
+                    samples[col] = values[:AFFINE_PROBES]
+            if samples:
+                self._probe(samples, maps, errors)
+            for col in undecided:
+                probed = maps.get(col, {})
+                fit = _fit_affine(probed) if len(probed) >= 2 else None
+                if fit is not None:
+                    affine[col] = fit
+                    maps.pop(col)
+                    self._undecided.discard(col)
+                    learned[col] = list(probed)
+                elif len(probed) >= 2:
+                    # Not affine: tabulate it like a categorical column
+                    self._undecided.discard(col)
+                else:
+                    self._undecided.add(col)
+
+        # Learn the encoding of every value not seen before
+        column_values = {}
+        for col in self.columns:
+            if col in affine:
+                continue
+            known = maps.get(col, {})
+            new_values = [v for v in pd.unique(df[col].dropna())
+                          if v not in known and (col, v) not in errors]
+            if new_values:
+                column_values[col] = new_values
+        if column_values:
+            self._probe(column_values, maps, errors)
+            for col, values in column_values.items():
+                learned.setdefault(col, []).extend(values)
+
+        self._maps, self._affine, self._errors = maps, affine, errors
+        return learned
+
+    def _verify(self, df, out, learned):
+        """Check a sample of the rows that use newly learned values against the row path"""
+        candidates = np.zeros(len(df), dtype=bool)
+        for col, values in learned.items():
+            candidates |= df[col].isin(values).to_numpy()
+        candidates = np.flatnonzero(candidates)
+        n = min(self.verify_rows, len(candidates))
+        for pos in self._rng.choice(candidates, size=n, replace=False):
+            expected = self._run_row(df.iloc[pos].to_dict())
+            actual = out.iloc[pos]
+            for col in self.columns:
+                if not (expected[col] == actual[col]
+                        or (pd.isna(expected[col]) and pd.isna(actual[col]))
+                        or (col in self._affine and np.isclose(expected[col], actual[col],
+                                                               rtol=1e-9, atol=1e-12))):
+                    return False
+        return True
+
+    def transform(self, df, return_invalid=False):
+        """Encode every row of df, returning a frame indexed like df.
+
+        With return_invalid=True, rows the row path would reject are returned as a
+        boolean mask instead of raising, and their output values are undefined.
+        """
+        if self.extensions is None:
+            return self._transform(df, return_invalid)
+        df, patches = self.extensions.prepare(df)
+        result = self._transform(df, return_invalid)
+        if patches:
+            self.extensions.patch(result[0] if return_invalid else result, patches)
+        return result
+
+    def _transform(self, df, return_invalid):
+        invalid = np.zeros(len(df), dtype=bool)
+        if len(df) == 0:
+            out = pd.DataFrame(columns=self.columns or [], index=df.index)
+            return (out, invalid) if return_invalid else out
+
+        learned = None
+        if self.compiled:
+            with self._lock:
+                learned = self._compile(df)
+        if learned is None:
+            return self._transform_rows(df, return_invalid)
+        maps, affine, errors = self._maps, self._affine, self._errors
+
+        encoded = {}
+        fallback = np.zeros(len(df), dtype=bool)
+        for col in self.columns:
+            values = df[col]
+            for (err_col, value), _ in errors.items():
+                if err_col == col:
+                    invalid |= (values == value).to_numpy()
+            if col in affine:
+                slope, intercept = affine[col]
+                numeric = values.to_numpy()
+                encoded[col] = numeric if (slope, intercept) == (1.0, 0.0) else numeric * slope + intercept
+                # Missing values go through the row path, whatever it makes of them
+                fallback |= values.isna().to_numpy()
+                continue
+            mapped = values.map(maps.get(col, {}))
+            fallback |= mapped.isna().to_numpy()
+            encoded[col] = mapped.to_numpy()
+
+        if invalid.any() and not return_invalid:
+            col, value = next(key for key in errors
+                              if (df[key[0]] == key[1]).any())
+            raise errors[(col, value)]
+
+        out = pd.DataFrame(encoded, index=df.index)
+        fallback &= ~invalid
+        if fallback.any():
+            # Values we couldn't tabulate (e.g. NaN keys) go through the row path
+            if return_invalid:
+                rows, row_invalid = self._transform_rows(df[fallback], True)
+                invalid[np.flatnonzero(fallback)[row_invalid]] = True
+            else:
+                rows = self._transform_rows(df[fallback], False)
+            out.loc[fallback] = rows.to_numpy()
+        valid_rows = ~invalid
+        if invalid.any():
+            out.loc[invalid] = 0
+        out = out.astype({col: self.dtypes[col] for col in self.columns})
+
+        if learned and valid_rows.any():
+            with self._lock:
+                verified = self._verify(df[valid_rows], out[valid_rows], learned)
+            if not verified:
+                logger.warning("Columnar preprocessing did not match preprocess_data; "
+                               "using the row path")
+                self.compiled = False
+                return self._transform_rows(df, return_invalid)
+
+        return (out, invalid) if return_invalid else out
+
+    def _transform_rows(self, df, return_invalid):
+        rows = []
+        invalid = np.zeros(len(df), dtype=bool)
+        for i, record in enumerate(df.to_dict('records')):
+            try:
+                rows.append(self._run_row(record))
+            except Exception:
+                if not return_invalid:
+                    raise
+                invalid[i] = True
+                rows.append(pd.Series(0, index=self.columns))
+        out = pd.DataFrame(rows, columns=self.columns)
+        out.index = df.index
+        return (out, invalid) if return_invalid else out
+
+
+def preprocess_frame(df, preprocessor=None):
+    """Preprocess a whole DataFrame of FEATURE_ORDER columns at once.
+
+    Equivalent to calling preprocess_data on every row and stacking the results.
+    Pass a FramePreprocessor to reuse its learned tables across calls.
+    """
+    if preprocessor is None:
+        preprocessor = FramePreprocessor()
+    return preprocessor.transform(df)
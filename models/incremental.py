@@ -0,0 +1,168 @@
+import hashlib
+import io
+import json
+import os
+
+import pandas as pd
+
+from models.model_utils import preprocess_data
+
+INGEST_STATE_PATH = 'models/ingest_state.json'
+EXTENSIONS_PATH = 'models/category_extensions.json'
+
+# Bytes just before the ingested offset that are hashed to detect edits to old rows
+TAIL_BYTES = 1 << 16
+
+
+def _write_json(path, data):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _tail_sha256(path, end):
+    start = max(0, end - TAIL_BYTES)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(end - start)).hexdigest()
+
+
+def record_ingest(csv_path, rows, size, state_path=INGEST_STATE_PATH):
+    """Remember how much of csv_path the current model has been trained on.
+
+    rows and size (in bytes) must describe the data as it was read for training,
+    not the file now: rows appended since then have not been trained on.
+    """
+    state = {
+        'csv_path': csv_path,
+        'rows': rows,
+        'bytes': size,
+        'tail_sha256': _tail_sha256(csv_path, size),
+    }
+    _write_json(state_path, state)
+    return state
+
+
+def load_ingest_state(state_path=INGEST_STATE_PATH):
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_appended_rows(csv_path, state):
+    """Return the rows appended to csv_path since state was recorded, and the byte
+    offset they end at.
+
+    Only the new bytes are parsed, up to the last complete line, so a row still
+    being written is left for the next run. Raises ValueError if the
+    already-ingested part of the file looks modified, since that needs a full retrain.
+    """
+    size = os.path.getsize(csv_path)
+    if size < state['bytes'] or _tail_sha256(csv_path, state['bytes']) != state['tail_sha256']:
+        raise ValueError(f"{csv_path} was modified, not just appended to; run a full retrain")
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        f.seek(state['bytes'])
+        appended = f.read()
+    appended = appended[:appended.rfind(b'\n') + 1]
+    end = state['bytes'] + len(appended)
+    if not appended.strip():
+        return pd.read_csv(io.BytesIO(header)), end
+    return pd.read_csv(io.BytesIO(header + appended)), end
+
+
+class CategoryExtensions:
+    """Append-only codes for categories the fitted preprocessors have never seen.
+
+    A full training run records, per categorical column, the values the encoders
+    were fitted on and the largest code they produce. Values that show up later are
+    given the next free code and keep it forever, so existing codes (and the trees
+    that split on them) never change. Before preprocessing, new values are swapped
+    for a known placeholder and the output column is then patched with their code.
+    """
+
+    def __init__(self, known=None, next_codes=None, codes=None):
+        self.known = {col: set(values) for col, values in (known or {}).items()}
+        self.placeholders = {col: sorted(values, key=str)[0]
+                             for col, values in (known or {}).items() if values}
+        self.next_codes = dict(next_codes or {})
+        self.codes = {col: dict(values) for col, values in (codes or {}).items()}
+
+    @classmethod
+    def from_training(cls, X_raw, X_processed):
+        columns = [col for col in X_raw.columns if col in X_processed.columns
+                   and not pd.api.types.is_numeric_dtype(X_raw[col])]
+        known = {col: X_raw[col].dropna().unique().tolist() for col in columns}
+        next_codes = {col: int(X_processed[col].max()) + 1 for col in columns}
+        return cls(known, next_codes)
+
+    def extend(self, df):
+        """Give every unseen value in df a new code; returns the (column, value, code) added"""
+        added = []
+        for col, known in self.known.items():
+            if col not in df.columns:
+                continue
+            codes = self.codes.setdefault(col, {})
+            for value in pd.unique(df[col].dropna()):
+                if value not in known and value not in codes:
+                    codes[value] = self.next_codes[col]
+                    self.next_codes[col] += 1
+                    added.append((col, value, codes[value]))
+        return added
+
+    def prepare(self, df):
+        """Swap extension values for placeholders; returns (df, patches) for patch()"""
+        patches = {}
+        for col, codes in self.codes.items():
+            if not codes or col not in df.columns:
+                continue
+            mask = df[col].isin(list(codes)).to_numpy()
+            if mask.any():
+                if not patches:
+                    df = df.copy()
+                patches[col] = (mask, df.loc[mask, col].map(codes).to_numpy())
+                df.loc[mask, col] = self.placeholders[col]
+        return df, patches
+
+    @staticmethod
+    def patch(processed, patches):
+        for col, (mask, codes) in patches.items():
+            values = processed[col].to_numpy().copy()
+            values[mask] = codes
+            processed[col] = values
+        return processed
+
+    def save(self, path=EXTENSIONS_PATH):
+        _write_json(path, {
+            'known': {col: sorted(values, key=str) for col, values in self.known.items()},
+            'next_codes': self.next_codes,
+            'codes': self.codes,
+        })
+
+    @classmethod
+    def load(cls, path=EXTENSIONS_PATH):
+        """Load saved extensions, or None if no full training run has recorded them"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(data['known'], data['next_codes'], data['codes'])
+
+
+def preprocess_record(data, extensions=None):
+    """preprocess_data for one record, honouring any category extensions"""
+    if extensions is None:
+        return preprocess_data(data)
+    data = dict(data)
+    patches = {}
+    for col, codes in extensions.codes.items():
+        if data.get(col) in codes:
+            patches[col] = codes[data[col]]
+            data[col] = extensions.placeholders[col]
+    processed = preprocess_data(data)
+    for col, code in patches.items():
+        processed[col] = code
+    return processed
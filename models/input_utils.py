@@ -0,0 +1,87 @@
+# NumPy and pandas are only needed for whole frames, so they're imported there and
+# the single-record helpers stay cheap to import
+
+# Fields every prediction request must supply
+REQUIRED_FIELDS = ['age', 'workclass', 'fnlwgt', 'education', 'occupation',
+                   'gender', 'capital-gain', 'capital-loss',
+                   'hours-per-week', 'native-country']
+
+NUMERIC_FIELDS = ['age', 'fnlwgt', 'educational-num', 'capital-gain',
+                  'capital-loss', 'hours-per-week']
+
+EDUCATION_MAP = {
+    'Preschool': 1, '1st-4th': 2, '5th-6th': 3, '7th-8th': 4,
+    '9th': 5, '10th': 6, '11th': 7, '12th': 8, 'HS-grad': 9,
+    'Some-college': 10, 'Assoc-voc': 11, 'Assoc-acdm': 12,
+    'Bachelors': 13, 'Masters': 14, 'Prof-school': 15, 'Doctorate': 16
+}
+
+# Defaults for optional fields the form doesn't ask for
+FIELD_DEFAULTS = {
+    'race': 'White',
+    'marital-status': 'Never-married',
+    'relationship': 'Not-in-family',
+}
+
+
+def missing_fields(data):
+    """Return the required fields missing from one request record"""
+    return [field for field in REQUIRED_FIELDS if field not in data]
+
+
+def fill_defaults(data):
+    """Add missing optional fields to one request record, in place"""
+    if 'educational-num' not in data:
+        data['educational-num'] = EDUCATION_MAP.get(data['education'], 0)
+    for field, default in FIELD_DEFAULTS.items():
+        if field not in data:
+            data[field] = default
+    return data
+
+
+def fill_frame_defaults(df):
+    """Vectorized fill_defaults for a DataFrame of request records, in place"""
+    import numpy as np
+    if 'educational-num' not in df.columns:
+        df['educational-num'] = np.nan
+    missing = df['educational-num'].isna()
+    if missing.any():
+        df.loc[missing, 'educational-num'] = (
+            df.loc[missing, 'education'].map(EDUCATION_MAP).fillna(0))
+    for field, default in FIELD_DEFAULTS.items():
+        if field not in df.columns:
+            df[field] = default
+        else:
+            df[field] = df[field].fillna(default)
+    return df
+
+
+def validate_frame(df):
+    """Check a DataFrame of request records.
+
+    Numeric fields are converted in place. Returns an object array holding an
+    error message for each invalid row and None for valid ones.
+    """
+    import numpy as np
+    import pandas as pd
+    errors = np.full(len(df), None, dtype=object)
+
+    missing = {}
+    for field in REQUIRED_FIELDS:
+        if field not in df.columns:
+            df[field] = np.nan
+        missing[field] = df[field].isna().to_numpy()
+    any_missing = np.logical_or.reduce(list(missing.values()))
+    for i in np.flatnonzero(any_missing):
+        fields = [field for field in REQUIRED_FIELDS if missing[field][i]]
+        errors[i] = f"Missing required fields: {', '.join(fields)}"
+
+    for field in NUMERIC_FIELDS:
+        if field not in df.columns:
+            continue
+        numbers = pd.to_numeric(df[field], errors='coerce')
+        bad = (numbers.isna() & df[field].notna()).to_numpy() & pd.isna(errors)
+        for i in np.flatnonzero(bad):
+            errors[i] = f"Invalid value for {field}: {df[field].iloc[i]!r}"
+        df[field] = numbers
+    return errors
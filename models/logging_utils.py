@@ -0,0 +1,41 @@
+import logging
+import random
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s'
+
+
+class SamplingFilter(logging.Filter):
+    """Passes only a random fraction of records at or below max_level.
+
+    Warnings and errors are always kept; routine per-request lines can be sampled
+    down so logging stays cheap under load.
+    """
+
+    def __init__(self, rate, max_level=logging.INFO):
+        super().__init__()
+        self.rate = rate
+        self.max_level = max_level
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+def configure_logging(name, level='INFO', sample_rate=1.0):
+    """Set up a logger writing to stderr at level, keeping sample_rate of routine lines.
+
+    Calling it again (e.g. from every forked worker) leaves the existing handler alone.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+        logger.propagate = False
+    for existing in [f for f in logger.filters if isinstance(f, SamplingFilter)]:
+        logger.removeFilter(existing)
+    if sample_rate < 1:
+        logger.addFilter(SamplingFilter(sample_rate))
+    return logger
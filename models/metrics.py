@@ -0,0 +1,138 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from 50µs to 2.5s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, labelvalues)} {value}'
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets, optionally split by label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [per-bucket counts (last is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = {key: (list(counts), total, count)
+                        for key, (counts, total, count) in self._series.items()}
+        for labelvalues, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield (f'{self.name}_bucket'
+                       f'{_labels(self.labelnames, labelvalues, [("le", le)])} {cumulative}')
+            yield f'{self.name}_sum{_labels(self.labelnames, labelvalues)} {total}'
+            yield f'{self.name}_count{_labels(self.labelnames, labelvalues)} {count}'
+
+
+class MetricsRegistry:
+    """The metrics of one process, rendered in the Prometheus text format"""
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class RequestTimer:
+    """Timing spans for the stages of one request.
+
+    Each span is observed in stage_histogram (labelled by stage) as it ends and kept
+    in spans, so the request can also report its own breakdown.
+    """
+
+    def __init__(self, stage_histogram):
+        self._histogram = stage_histogram
+        self.start = time.perf_counter()
+        self.spans = {}
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.spans[stage] = self.spans.get(stage, 0.0) + elapsed
+            self._histogram.observe(elapsed, stage)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        """The spans as a Server-Timing header value, in milliseconds"""
+        return ', '.join(f'{stage};dur={seconds * 1000:.3f}' for stage, seconds in self.spans.items())
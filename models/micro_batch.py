@@ -0,0 +1,93 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item requests into batched calls.
+
+    submit() queues an item and waits while a background thread scores it. The
+    thread takes the first waiting item, keeps collecting until max_batch_size items
+    are queued or max_wait seconds have passed, and hands them all to
+    score_batch(items), which returns one result per item. Concurrent requests
+    therefore share one vectorized model call, while a lone request waits at most
+    max_wait.
+
+    Threads don't survive fork, so each worker process starts its own on first use.
+    """
+
+    def __init__(self, score_batch, max_batch_size=32, max_wait=0.002):
+        self._score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    @property
+    def enabled(self):
+        return self.max_batch_size > 1
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                name='micro-batcher', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, item, timeout=None):
+        """Score item together with any concurrent submissions and return its result"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout)
+
+    def _collect(self, pending):
+        batch = [pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(pending.get(timeout=remaining) if remaining > 0
+                             else pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, pending):
+        while True:
+            batch = self._collect(pending)
+            try:
+                results = self._score_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'batches': self.batches,
+                'items': self.items,
+                'mean_batch_size': round(self.items / self.batches, 2) if self.batches else None,
+                'largest_batch': self.largest_batch,
+            }
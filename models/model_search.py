@@ -0,0 +1,125 @@
+import math
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+
+class FoldCache:
+    """Train/validation matrices for each CV fold, sliced once and shared by every candidate"""
+
+    def __init__(self, X, y, cv=3):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        y = np.asarray(y)
+        self.classes = np.unique(y)
+        self.folds = []
+        for train_idx, test_idx in StratifiedKFold(n_splits=cv).split(X, y):
+            self.folds.append((X[train_idx], y[train_idx], X[test_idx], y[test_idx]))
+
+
+def successive_halving_search(X, y, param_grid, min_trees=25, max_trees=200, factor=3,
+                              cv=3, random_state=42, n_jobs=-1, verbose=True):
+    """Successive halving over param_grid with the number of trees as the budget.
+
+    Every candidate starts with min_trees trees per fold; after each rung the best
+    1/factor of candidates survive and their forests grow by factor, up to max_trees.
+    Surviving candidates keep their earlier trees: only the new trees are fitted, and
+    their validation probabilities are added to a running sum per fold, so growing a
+    forest costs only the added trees and no fitted forests are kept in memory.
+
+    Returns (best_params, best_n_estimators, report).
+    """
+    search_start = time.perf_counter()
+    folds = FoldCache(X, y, cv).folds
+    candidates = list(ParameterGrid(param_grid))
+    # Sum over fitted trees of validation-fold class probabilities, per candidate and fold
+    proba_sums = {}
+    trees_fitted = {}
+
+    alive = list(range(len(candidates)))
+    n_trees = min_trees
+    rungs = []
+    total_tree_fits = 0
+    while True:
+        rung = {'n_estimators': n_trees, 'candidates': []}
+        scores = {}
+        for index in alive:
+            params = candidates[index]
+            fit_start = time.perf_counter()
+            fold_scores = []
+            for fold, (X_fit, y_fit, X_val, y_val) in enumerate(folds):
+                have = trees_fitted.get((index, fold), 0)
+                add = n_trees - have
+                forest = RandomForestClassifier(n_estimators=add, n_jobs=n_jobs,
+                                                random_state=random_state + have, **params)
+                forest.fit(X_fit, y_fit)
+                total_tree_fits += add
+                added = forest.predict_proba(X_val) * add
+                proba_sums[(index, fold)] = proba_sums.get((index, fold), 0) + added
+                trees_fitted[(index, fold)] = n_trees
+                predicted = forest.classes_[np.argmax(proba_sums[(index, fold)], axis=1)]
+                fold_scores.append(float(np.mean(predicted == y_val)))
+            fit_seconds = time.perf_counter() - fit_start
+            scores[index] = float(np.mean(fold_scores))
+            rung['candidates'].append({
+                'params': params,
+                'mean_score': round(scores[index], 5),
+                'fold_scores': [round(score, 5) for score in fold_scores],
+                'fit_seconds': round(fit_seconds, 3),
+            })
+            if verbose:
+                print(f"  [{n_trees} trees] {params}: {scores[index]:.4f} ({fit_seconds:.1f}s)")
+        rungs.append(rung)
+
+        ranked = sorted(alive, key=lambda i: scores[i], reverse=True)
+        if n_trees >= max_trees or len(ranked) == 1:
+            best = ranked[0]
+            break
+        alive = ranked[:max(1, math.ceil(len(ranked) / factor))]
+        for index in ranked[len(alive):]:
+            for fold in range(len(folds)):
+                proba_sums.pop((index, fold), None)
+        n_trees = min(max_trees, n_trees * factor)
+
+    report = {
+        'search': 'successive_halving',
+        'factor': factor,
+        'min_trees': min_trees,
+        'max_trees': max_trees,
+        'cv': cv,
+        'n_candidates': len(candidates),
+        'rungs': rungs,
+        'total_tree_fits': total_tree_fits,
+        'search_seconds': round(time.perf_counter() - search_start, 3),
+        'best_params': candidates[best],
+        'best_n_estimators': n_trees,
+        'best_cv_score': round(scores[best], 5),
+    }
+    return candidates[best], n_trees, report
+
+
+def grid_search_report(grid_search, search_seconds):
+    """Training report in the same shape for a fitted GridSearchCV"""
+    results = grid_search.cv_results_
+    n_splits = grid_search.n_splits_
+    candidates = []
+    for i, params in enumerate(results['params']):
+        candidates.append({
+            'params': params,
+            'mean_score': round(float(results['mean_test_score'][i]), 5),
+            'fold_scores': [round(float(results[f'split{k}_test_score'][i]), 5)
+                            for k in range(n_splits)],
+            'fit_seconds': round(float(results['mean_fit_time'][i]) * n_splits, 3),
+        })
+    return {
+        'search': 'grid',
+        'cv': n_splits,
+        'n_candidates': len(candidates),
+        'rungs': [{'n_estimators': None, 'candidates': candidates}],
+        'total_tree_fits': int(sum(p['n_estimators'] for p in results['params']) * n_splits),
+        'search_seconds': round(search_seconds, 3),
+        'best_params': grid_search.best_params_,
+        'best_n_estimators': grid_search.best_params_.get('n_estimators'),
+        'best_cv_score': round(float(grid_search.best_score_), 5),
+    }
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+
+from models.input_utils import NUMERIC_FIELDS
+
+
+def _normalize(field, value):
+    """Canonical form of one field so equivalent inputs share a cache key"""
+    if field in NUMERIC_FIELDS:
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return ('raw', str(value))
+        return int(number) if number.is_integer() else number
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def record_key(data, fields):
+    """Build a hashable key from a default-filled request record"""
+    return tuple(_normalize(field, data.get(field)) for field in fields)
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with a time-to-live for single-record predictions.
+
+    Keys include the model version, and clear() is registered as a model reload
+    callback, so results from an old model are never served.
+    """
+
+    def __init__(self, maxsize=4096, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, version, key):
+        if not self.enabled:
+            return None
+        full_key = (version, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl and now - stored_at > self.ttl:
+                del self._entries[full_key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(full_key)
+            self.hits += 1
+            return value
+
+    def put(self, version, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[(version, key)] = (time.monotonic(), value)
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, *args):
+        """Drop every entry; accepts and ignores the reload callback's argument"""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
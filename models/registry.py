@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = 'models/income_predictor.pkl'
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Return the hex sha256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_pickle(path):
+    """Default ModelRegistry loader; joblib is imported on first use"""
+    import joblib
+    return joblib.load(path)
+
+
+class LoadedModel:
+    """An immutable snapshot of one loaded model file.
+
+    companions holds whatever was saved alongside the model (preprocessing and
+    calibration tables, say), loaded with it so a request never mixes two models' sets.
+    """
+
+    def __init__(self, model, path, sha256, mtime, load_seconds, companions=None):
+        self.model = model
+        self.companions = dict(companions or {})
+        self.path = path
+        self.sha256 = sha256
+        self.version = sha256[:12]
+        self.mtime = mtime
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def info(self):
+        return {
+            'version': self.version,
+            'sha256': self.sha256,
+            'loaded_at': self.loaded_at.isoformat(),
+            'load_seconds': round(self.load_seconds, 4),
+            'file_mtime': datetime.fromtimestamp(self.mtime, timezone.utc).isoformat(),
+        }
+
+
+class ModelRegistry:
+    """Keeps one warm copy of the model per process and hot-swaps it when the file changes.
+
+    Callers grab the current snapshot with get() and use it for the whole request,
+    so a reload only affects requests that start after the swap. load_companions,
+    if given, is called with each newly loaded model and returns the dict stored as
+    the snapshot's companions; it runs before the swap, so they are published together.
+    """
+
+    def __init__(self, path=DEFAULT_MODEL_PATH, check_interval=2.0, loader=load_pickle,
+                 load_companions=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.loader = loader
+        self.load_companions = load_companions
+        self._current = None
+        self._stat = None
+        self._last_check = 0.0
+        self._load_lock = threading.Lock()
+        self._listeners = []
+        self.reload_count = 0
+        self.last_error = None
+
+    def on_reload(self, callback):
+        """Register callback(loaded_model) to run after every successful swap"""
+        self._listeners.append(callback)
+
+    def get(self):
+        """Return the current LoadedModel, or None if no model file is available"""
+        now = time.monotonic()
+        if self._current is None or now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self._refresh()
+        return self._current
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        stat = self._file_stat()
+        if stat is None:
+            # Keep serving the last good model if the file is briefly missing
+            return
+        if stat == self._stat and self._current is not None:
+            return
+        # Only one thread loads; the others keep using the current snapshot
+        if not self._load_lock.acquire(blocking=self._current is None):
+            return
+        try:
+            stat = self._file_stat()
+            if stat is None or (stat == self._stat and self._current is not None):
+                return
+            sha256 = file_sha256(self.path)
+            if self._current is not None and sha256 == self._current.sha256:
+                # Touched but not changed
+                self._stat = stat
+                return
+            start = time.perf_counter()
+            try:
+                model = self.loader(self.path)
+                companions = self.load_companions(model) if self.load_companions else None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("Error loading model from %s", self.path)
+                return
+            loaded = LoadedModel(model, self.path, sha256, stat[0] / 1e9,
+                                 time.perf_counter() - start, companions)
+            self._current = loaded
+            self._stat = stat
+            self.reload_count += 1
+            self.last_error = None
+            logger.info("Loaded model %s from %s in %.3fs", loaded.version, self.path,
+                        loaded.load_seconds)
+            for callback in self._listeners:
+                callback(loaded)
+        finally:
+            self._load_lock.release()
+
+    def status(self):
+        current = self.get()
+        status = {
+            'model_exists': os.path.exists(self.path),
+            'model_path': self.path,
+            'loaded': current is not None,
+            'reload_count': self.reload_count,
+        }
+        if current is not None:
+            status.update(current.info())
+        if self.last_error:
+            status['last_error'] = self.last_error
+        return status
@@ -0,0 +1,165 @@
+import operator
+import threading
+
+import numpy as np
+import pandas as pd
+
+BASIC_EDUCATION = ['HS-grad', 'Some-college', '11th', '12th', '10th', '9th']
+HIGHER_EDUCATION = ['Bachelors', 'Masters', 'Doctorate']
+
+# Rules used for a simulated prediction when no model has been trained.
+# They are checked in order and the first matching rule decides the result.
+FALLBACK_RULES = [
+    {
+        # Young person with basic education and service job: Likely <=50K
+        'name': 'Young worker with basic education',
+        'high_income': False,
+        'conditions': [
+            ('age', '<', 30),
+            ('education', 'in', BASIC_EDUCATION),
+            ('occupation', 'in', ['Other-service', 'Adm-clerical', 'Handlers-cleaners', 'Farming-fishing']),
+            ('hours-per-week', '<', 40),
+        ],
+    },
+    {
+        # Young person regardless of job with no capital gain: Likely <=50K
+        'name': 'Young worker with no capital gain',
+        'high_income': False,
+        'conditions': [('age', '<', 25), ('capital-gain', '<', 1000)],
+    },
+    {
+        # Executive with higher education working long hours: Likely >50K
+        'name': 'Executive with higher education',
+        'high_income': True,
+        'conditions': [
+            ('age', '>', 35),
+            ('education', 'in', HIGHER_EDUCATION),
+            ('occupation', 'in', ['Exec-managerial', 'Prof-specialty']),
+            ('hours-per-week', '>=', 45),
+        ],
+    },
+    {
+        # Significant capital gain often indicates >50K
+        'name': 'High capital gain',
+        'high_income': True,
+        'conditions': [('capital-gain', '>', 5000)],
+    },
+    {
+        # Men over 35 with good education: More likely >50K
+        'name': 'Older male with higher education',
+        'high_income': True,
+        'conditions': [
+            ('gender', '==', 'Male'),
+            ('age', '>=', 35),
+            ('education', 'in', HIGHER_EDUCATION + ['Prof-school']),
+        ],
+    },
+    {
+        'name': 'Default demographic',
+        'high_income': False,
+        'conditions': [],
+    },
+]
+
+# Rules applied on top of the model's prediction for profiles it tends to get wrong
+OVERRIDE_RULES = [
+    {
+        # This profile should almost always be <=50K
+        'name': 'Young worker profile',
+        'high_income': False,
+        'note': "Prediction adjusted based on demographic rules (young worker profile)",
+        'conditions': [
+            ('age', '<', 30),
+            ('education', 'in', BASIC_EDUCATION),
+            ('occupation', 'in', ['Other-service', 'Handlers-cleaners', 'Adm-clerical']),
+            ('hours-per-week', '<', 40),
+            ('capital-gain', '<', 1000),
+        ],
+    },
+]
+
+_COMPARISONS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def _compile_condition(field, op, value):
+    """Turn one (field, op, value) condition into a function of a frame returning a mask"""
+    if op == 'in':
+        allowed = list(value)
+        return lambda frame: frame[field].isin(allowed).to_numpy()
+    if op == '==':
+        return lambda frame: (frame[field] == value).to_numpy()
+    if op in _COMPARISONS:
+        compare = _COMPARISONS[op]
+        # Missing or non-numeric values never match
+        return lambda frame: compare(pd.to_numeric(frame[field], errors='coerce'), value) \
+            .fillna(False).to_numpy(dtype=bool)
+    raise ValueError(f"Unknown rule operator: {op}")
+
+
+class RuleSet:
+    """An ordered rule table compiled into vectorized boolean masks.
+
+    evaluate() returns, for every row, the index of the first rule that matches it
+    (-1 when none do). Hit counts per rule are kept for monitoring.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._compiled = []
+        for rule in rules:
+            self._compiled.append([_compile_condition(*condition)
+                                   for condition in rule['conditions']])
+        self.high_income = np.array([rule['high_income'] for rule in rules], dtype=bool)
+        self._hits = np.zeros(len(rules), dtype=np.int64)
+        self._evaluated = 0
+        self._lock = threading.Lock()
+
+    def evaluate(self, frame):
+        matched = np.full(len(frame), -1, dtype=np.int64)
+        for index, conditions in enumerate(self._compiled):
+            undecided = matched == -1
+            if not undecided.any():
+                break
+            mask = undecided.copy()
+            for condition in conditions:
+                mask &= condition(frame)
+            matched[mask] = index
+        counts = np.bincount(matched[matched >= 0], minlength=len(self.rules))
+        with self._lock:
+            self._hits += counts
+            self._evaluated += len(frame)
+        return matched
+
+    def apply(self, frame, predictions):
+        """Return predictions with matching rows replaced by their rule's result"""
+        matched = self.evaluate(frame)
+        hit = matched >= 0
+        predictions = np.asarray(predictions).copy()
+        predictions[hit] = self.high_income[matched[hit]]
+        return predictions, matched
+
+    def rule_name(self, index):
+        return self.rules[index]['name'] if index >= 0 else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rows_evaluated': int(self._evaluated),
+                'hits': {rule['name']: int(hits) for rule, hits in zip(self.rules, self._hits)},
+            }
+
+
+fallback_rules = RuleSet(FALLBACK_RULES)
+override_rules = RuleSet(OVERRIDE_RULES)
+
+
+def rule_stats():
+    return {
+        'fallback': fallback_rules.stats(),
+        'override': override_rules.stats(),
+    }
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from models.model_utils import FEATURE_ORDER
+from models.rules import fallback_rules, override_rules
+
+SIMULATED_NOTE = 'This is a simulated prediction based on demographic rules since the model file is missing'
+
+
+def score_frame(model, preprocessor, frame, errors, return_processed=False):
+    """Score a validated, default-filled frame of records in one predict_proba call.
+
+    errors holds a message for each row that failed validation (None otherwise) and
+    is updated with rows that fail preprocessing. Returns predictions (0/1 after the
+    override rules), probabilities of >50K, the updated errors and, per row, the
+    index of the override rule applied (-1 for none). With return_processed=True,
+    also returns the preprocessed rows the model scored and their positions in
+    frame, so callers can reuse them instead of preprocessing again.
+    """
+    errors = errors.copy()
+    valid = pd.isna(errors)
+    probabilities = np.full(len(frame), np.nan)
+    predictions = np.zeros(len(frame), dtype=int)
+    scored = np.array([], dtype=np.int64)
+    scored_rows = None
+    if valid.any():
+        processed, invalid = preprocessor.transform(frame.loc[valid, FEATURE_ORDER],
+                                                    return_invalid=True)
+        errors[np.flatnonzero(valid)[invalid]] = "Could not preprocess record"
+        scored = np.flatnonzero(valid)[~invalid]
+        if len(scored):
+            scored_rows = processed[~invalid]
+            proba = model.predict_proba(scored_rows)
+            positive = list(model.classes_).index(1)
+            probabilities[scored] = proba[:, positive]
+            predictions[scored] = model.classes_[np.argmax(proba, axis=1)]
+
+    overrides = np.full(len(frame), -1, dtype=np.int64)
+    valid = pd.isna(errors)
+    if valid.any():
+        rows = np.flatnonzero(valid)
+        predictions[rows], overrides[rows] = override_rules.apply(frame.iloc[rows],
+                                                                  predictions[rows])
+    if return_processed:
+        return predictions, probabilities, errors, overrides, scored_rows, scored
+    return predictions, probabilities, errors, overrides
+
+
+def simulate_frame(frame, errors):
+    """Rule-based stand-in for score_frame when no model has been trained.
+
+    Returns predictions and, per row, the index of the fallback rule that decided it.
+    """
+    predictions = np.zeros(len(frame), dtype=int)
+    matched = np.full(len(frame), -1, dtype=np.int64)
+    valid = pd.isna(errors)
+    if valid.any():
+        rows = np.flatnonzero(valid)
+        matched[rows] = fallback_rules.evaluate(frame.iloc[rows])
+        predictions[rows] = fallback_rules.high_income[matched[rows]]
+    return predictions, matched
+
+
+def override_note(index):
+    """The response note for an override rule index, or None"""
+    return override_rules.rules[index].get('note') if index >= 0 else None
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from models.input_utils import EDUCATION_MAP, NUMERIC_FIELDS
+from models.model_utils import FEATURE_ORDER
+
+# Largest grid one /predict/sweep request may score
+MAX_GRID_POINTS = 5000
+MAX_SWEEP_FEATURES = 2
+
+
+def sweep_values(feature, spec):
+    """The values to try for one varied feature.
+
+    spec is a list of values, or for numeric features a {"start", "stop", "step"}
+    range that includes stop. education may be null to try every level in order.
+    """
+    if spec is None:
+        if feature == 'education':
+            return list(EDUCATION_MAP)
+        raise ValueError(f"Give the values to try for {feature}")
+    if isinstance(spec, dict):
+        if feature not in NUMERIC_FIELDS:
+            raise ValueError(f"{feature} is not numeric; give a list of values to try")
+        try:
+            start, stop = float(spec['start']), float(spec['stop'])
+            step = float(spec.get('step', 1))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"A range for {feature} needs numeric start and stop, and an optional step")
+        if step <= 0 or stop < start:
+            raise ValueError(f"The range for {feature} needs start <= stop and a positive step")
+        if (stop - start) / step >= MAX_GRID_POINTS:
+            raise ValueError(f"The range for {feature} has more than {MAX_GRID_POINTS} values")
+        values = start + step * np.arange(int(np.floor((stop - start) / step + 1e-9)) + 1)
+        return [int(v) if float(v).is_integer() else float(v) for v in values]
+    if isinstance(spec, list) and spec:
+        return spec
+    raise ValueError(f"The values for {feature} must be a non-empty list")
+
+
+def build_grid(profile, vary):
+    """Every combination of the varied features' values applied to one profile.
+
+    vary maps up to two features to their value specs, in axis order. Returns the
+    axes as [(feature, values)] and a DataFrame with one row per grid point, the
+    last axis varying fastest. When education varies on its own, educational-num
+    follows it as fill_defaults would set it.
+    """
+    if not isinstance(vary, dict) or not 1 <= len(vary) <= MAX_SWEEP_FEATURES:
+        raise ValueError(f"'vary' must map 1 to {MAX_SWEEP_FEATURES} features to the values to try")
+    unknown = [feature for feature in vary if feature not in FEATURE_ORDER]
+    if unknown:
+        raise ValueError(f"Unknown feature(s) to vary: {', '.join(unknown)}")
+    axes = [(feature, sweep_values(feature, spec)) for feature, spec in vary.items()]
+    shape = tuple(len(values) for _, values in axes)
+    n_points = int(np.prod(shape))
+    if n_points > MAX_GRID_POINTS:
+        raise ValueError(f"The grid has {n_points} points; the limit is {MAX_GRID_POINTS}")
+
+    frame = pd.DataFrame([profile] * n_points)
+    indices = np.indices(shape).reshape(len(axes), -1)
+    for (feature, values), index in zip(axes, indices):
+        frame[feature] = np.array(values, dtype=object)[index]
+    if 'education' in vary and 'educational-num' not in vary:
+        frame['educational-num'] = frame['education'].map(EDUCATION_MAP).fillna(0)
+    return axes, frame
+
+
+def decision_boundary(axes, predictions):
+    """Where the prediction flips between neighbouring values of the last axis.
+
+    predictions is the grid of 0/1 predictions. For two features every flip is
+    reported with the first feature's value it happens at.
+    """
+    *outer, (feature, values) = axes
+    grid = predictions.reshape(-1, len(values))
+    boundary = []
+    for row, outer_index in enumerate(np.ndindex(*[len(v) for _, v in outer])):
+        for i in np.flatnonzero(grid[row, 1:] != grid[row, :-1]):
+            point = {name: outer_values[j] for (name, outer_values), j in zip(outer, outer_index)}
+            point.update({
+                'feature': feature,
+                'between': [values[i], values[i + 1]],
+                'to': '>50K' if grid[row, i + 1] == 1 else '<=50K',
+            })
+            boundary.append(point)
+    return boundary
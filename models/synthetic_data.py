@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+# Relative noise added to each numeric column; zero-valued capital gains/losses stay zero
+NUMERIC_JITTER = {
+    'age': 0.05,
+    'fnlwgt': 0.10,
+    'capital-gain': 0.10,
+    'capital-loss': 0.10,
+    'hours-per-week': 0.05,
+}
+NUMERIC_LIMITS = {'age': (17, 90), 'hours-per-week': (1, 99)}
+
+
+def synthesize(df, n_rows, random_state=0):
+    """n_rows of synthetic data with df's schema and roughly its joint distribution.
+
+    Whole rows are resampled with replacement, so categories stay consistent with
+    each other and with income, then numeric columns are jittered so the rows are
+    not exact copies of the originals (which would flatter caches).
+    """
+    rng = np.random.default_rng(random_state)
+    out = df.iloc[rng.integers(0, len(df), size=n_rows)].reset_index(drop=True)
+    for col, scale in NUMERIC_JITTER.items():
+        if col not in out.columns:
+            continue
+        values = out[col].to_numpy(dtype=np.float64)
+        values = values * (1 + rng.normal(0, scale, size=n_rows))
+        low, high = NUMERIC_LIMITS.get(col, (0, None))
+        out[col] = np.clip(np.rint(values), low, high).astype(np.int64)
+    return out
+
+
+def write_synthetic_csv(df, path, n_rows, random_state=0):
+    """Write n_rows of synthetic data in adult.csv's format to path"""
+    synthetic = synthesize(df, n_rows, random_state)
+    synthetic.to_csv(path, index=False)
+    return synthetic
@@ -45,4 +45,4 @@ Write-Host "Once started, open your browser and go to: http://127.0.0.1:5000" -F
 Write-Host "Press Ctrl+C to stop the server when done." -ForegroundColor Cyan
 Write-Host
 
-& $pythonCmd -m flask run 
\ No newline at end of file
+& $pythonCmd serve.py 
\ No newline at end of file
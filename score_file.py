@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import pandas as pd
+
+from models.explanations import explain_scored, feature_names, load_explainer
+from models.forest_export import ArrayForest, DEFAULT_FOREST_DIR
+from models.frame_utils import FramePreprocessor
+from models.incremental import CategoryExtensions
+from models.input_utils import fill_frame_defaults, validate_frame
+from models.registry import file_sha256
+from models.rules import override_rules
+from models.scoring import score_frame
+
+DEFAULT_MODEL_PATH = 'models/income_predictor.pkl'
+
+# Per-process state, set once by load_worker_state
+_model = None
+_preprocessor = None
+_explainer = None
+
+
+def matching_forest(model_path, forest_dir):
+    """forest_dir if the forest exported there was made from the model at model_path"""
+    try:
+        with open(os.path.join(forest_dir, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return forest_dir if meta.get('source_sha256') == file_sha256(model_path) else None
+
+
+def load_worker_state(model_path, forest_dir=None, explain=False):
+    """Load the model once per process.
+
+    With forest_dir, the model is the exported ArrayForest, whose node arrays are
+    memory-mapped, so every worker reads the same page-cached copy. Otherwise each
+    process unpickles its own copy of the forest from model_path. explain needs
+    forest_dir, as the export is also what explains predictions.
+    """
+    global _model, _preprocessor, _explainer
+    if forest_dir:
+        _model = ArrayForest(forest_dir)
+    else:
+        _model = joblib.load(model_path)
+    _preprocessor = FramePreprocessor(extensions=CategoryExtensions.load())
+    _explainer = load_explainer(_model) if explain else None
+
+
+def score_chunk(chunk):
+    """Score one chunk of input rows, returning it with prediction columns added"""
+    frame = chunk.copy()
+    errors = validate_frame(frame)
+    fill_frame_defaults(frame)
+    predictions, probabilities, errors, overrides, scored_rows, scored = score_frame(
+        _model, _preprocessor, frame, errors, return_processed=True)
+    result = chunk.copy()
+    result['prediction'] = ['>50K' if p == 1 else '<=50K' for p in predictions]
+    result['probability_>50K'] = probabilities.round(4)
+    result['rule_override'] = [override_rules.rule_name(i) for i in overrides]
+    result['error'] = errors
+    result.loc[result['error'].notna(), 'prediction'] = None
+    if _explainer is not None:
+        base_value, contributions = explain_scored(_explainer, scored_rows, scored, len(frame))
+        result['base_value_>50K'] = round(base_value, 4) if base_value is not None else None
+        for j, name in enumerate(feature_names(_explainer)):
+            result[f'contribution_{name}'] = contributions[:, j].round(4)
+    return result
+
+
+def read_chunks(path, chunksize):
+    """Yield DataFrames of at most chunksize rows from a CSV or Parquet file"""
+    if path.lower().endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Reading Parquet files requires pyarrow: pip install pyarrow")
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, skipinitialspace=True)
+
+
+def write_chunk(result, output_path, first):
+    result.to_csv(output_path, mode='w' if first else 'a', header=first, index=False)
+
+
+def score_serial(chunks, output_path):
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        write_chunk(score_chunk(chunk), output_path, i == 0)
+        rows += len(chunk)
+        print(f"Scored {rows} rows...")
+    return rows
+
+
+def score_parallel(chunks, output_path, workers, model_path, forest_dir=None, explain=False):
+    """Score chunks across a process pool, writing results in input order.
+
+    At most two chunks per worker are in flight so memory stays bounded.
+    """
+    rows = 0
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_worker_state,
+                             initargs=(model_path, forest_dir, explain)) as pool:
+        pending = []
+        first = True
+        for chunk in chunks:
+            pending.append(pool.submit(score_chunk, chunk))
+            if len(pending) >= max_pending:
+                result = pending.pop(0).result()
+                write_chunk(result, output_path, first)
+                first = False
+                rows += len(result)
+                print(f"Scored {rows} rows...")
+        for future in pending:
+            result = future.result()
+            write_chunk(result, output_path, first)
+            first = False
+            rows += len(result)
+            print(f"Scored {rows} rows...")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a CSV or Parquet file of people with the income model")
+    parser.add_argument('input', help="CSV or Parquet file with adult.csv-shaped columns")
+    parser.add_argument('output', help="CSV file to write predictions to")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="Path to the trained model")
+    parser.add_argument('--chunksize', type=int, default=50000, help="Rows per chunk")
+    parser.add_argument('--workers', type=int, default=1, help="Number of worker processes")
+    parser.add_argument('--explain', action='store_true',
+                        help="Add each feature's contribution to the >50K probability")
+    parser.add_argument('--forest', default=DEFAULT_FOREST_DIR,
+                        help="Exported forest to score with, if it matches --model; needed for --explain")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"Model file not found: {args.model}. Run train_model.py first.")
+        return
+
+    forest_dir = matching_forest(args.model, args.forest)
+    # Fail before any worker starts if nothing can explain the model
+    if args.explain and (forest_dir is None or not ArrayForest(forest_dir).has_paths):
+        raise SystemExit(f"No decision-path export in {args.forest} matches {args.model}; "
+                         "re-run train_model.py to explain predictions")
+    if forest_dir is None and args.workers > 1:
+        print(f"No export in {args.forest} matches {args.model}; "
+              "every worker loads its own copy of the model")
+
+    print(f"Scoring {args.input} with {args.model}...")
+    start = time.perf_counter()
+    chunks = read_chunks(args.input, args.chunksize)
+    if args.workers > 1:
+        rows = score_parallel(chunks, args.output, args.workers, args.model, forest_dir,
+                              args.explain)
+    else:
+        load_worker_state(args.model, forest_dir, args.explain)
+        rows = score_serial(chunks, args.output)
+    elapsed = time.perf_counter() - start
+
+    rate = rows / elapsed if elapsed > 0 else 0
+    print(f"Scored {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    print(f"Predictions written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
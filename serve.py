@@ -0,0 +1,83 @@
+import argparse
+import importlib.util
+import os
+
+
+def run_gunicorn(args):
+    """Pre-forked gunicorn workers sharing one copy of the model.
+
+    The app is imported and warmed up (the model loaded) once in the master
+    process before the workers are forked, so they share its memory copy-on-write.
+    Each worker runs several threads, whose concurrent /predict requests are
+    micro-batched.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class PreforkServer(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app, warm_up
+            warm_up()
+            return app
+
+    PreforkServer({
+        'bind': f'{args.host}:{args.port}',
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'preload_app': True,
+        'timeout': args.timeout,
+    }).run()
+
+
+def run_waitress(args):
+    """Single-process, multi-threaded fallback for platforms without gunicorn (Windows)"""
+    from waitress import serve
+    from app import app, start_warm_up
+    # Start listening at once; /ready reports when the model is warm
+    start_warm_up()
+    serve(app, host=args.host, port=args.port, threads=args.threads * args.workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the income prediction app for production use")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes")
+    parser.add_argument('--threads', type=int, default=8,
+                        help="Request threads per worker")
+    parser.add_argument('--max-batch', type=int, default=32,
+                        help="Most /predict requests scored in one model call (1 disables batching)")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0,
+                        help="How long a /predict request waits for others to batch with")
+    parser.add_argument('--timeout', type=int, default=60,
+                        help="Seconds before a silent worker is restarted")
+    args = parser.parse_args()
+
+    # Read by app.py when it is imported
+    os.environ['PREDICT_MAX_BATCH'] = str(args.max_batch)
+    os.environ['PREDICT_MAX_WAIT_MS'] = str(args.max_wait_ms)
+
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers x "
+          f"{args.threads} threads, micro-batches of up to {args.max_batch} "
+          f"within {args.max_wait_ms}ms")
+    if importlib.util.find_spec('gunicorn'):
+        run_gunicorn(args)
+    elif importlib.util.find_spec('waitress'):
+        print("gunicorn is not available; serving from one process with waitress")
+        run_waitress(args)
+    else:
+        raise SystemExit("A production server needs gunicorn (Linux/macOS) or waitress (Windows): "
+                         "pip install -r requirements.txt")
+
+
+if __name__ == '__main__':
+    main()
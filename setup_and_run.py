@@ -1,7 +1,76 @@
 import os
 import sys
+import json
+import glob
+import hashlib
+import argparse
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from models.registry import file_sha256
+
+MANIFEST_PATH = 'cache/pipeline_manifest.json'
+
+# Modules train_model.py imports from models/, directly or through each other
+TRAINING_MODULES = ['models/model_utils.py', 'models/frame_utils.py', 'models/rules.py',
+                    'models/forest_export.py', 'models/registry.py', 'models/model_search.py',
+                    'models/dataset_store.py', 'models/drift.py', 'models/compression.py',
+                    'models/calibration.py', 'models/incremental.py']
+
+
+class Stage:
+    """One step of the build: a command, the files it reads and the files it writes.
+
+    A stage is skipped when the hash of its inputs, its command and the outputs of
+    the stages it depends on matches the one stored in the manifest after its last
+    successful run, and its outputs still exist.
+    """
+
+    def __init__(self, name, command, inputs=(), outputs=(), after=(), description=None,
+                 on_failure=None):
+        self.name = name
+        self.command = command
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.after = list(after)
+        self.description = description or name
+        self.on_failure = on_failure
+
+
+STAGES = [
+    Stage('install', [sys.executable, '-m', 'pip', 'install', '-r', 'requirements.txt'],
+          inputs=['requirements.txt'],
+          description="Installing required packages",
+          on_failure="Failed to install packages. Continuing anyway..."),
+    Stage('dataset', [sys.executable, '-c',
+                      'from models.dataset_store import build_dataset_cache; build_dataset_cache()'],
+          inputs=['adult.csv', 'models/dataset_store.py'],
+          outputs=['cache/adult'],
+          after=['install'],
+          description="Building the dataset cache"),
+    # The preprocessors are fitted and saved by train_model.py with the model
+    Stage('model', [sys.executable, 'train_model.py'],
+          inputs=['adult.csv', 'train_model.py'] + TRAINING_MODULES,
+          # The files train_model.py writes itself, so deleting any of them triggers a
+          # rebuild. The fitted preprocessors are saved by models/model_utils.py under a
+          # name of its own, which isn't listed here.
+          outputs=['models/income_predictor.pkl',
+                   'models/income_predictor_forest', 'models/income_predictor_compact',
+                   'models/calibration.npz', 'models/drift_reference.json',
+                   'models/category_extensions.json', 'models/ingest_state.json',
+                   'models/training_report.json'],
+          after=['dataset'],
+          description="Training the income prediction model",
+          on_failure="Model training failed, but we'll continue with simulated predictions."),
+    Stage('charts', [sys.executable, 'generate_visualizations.py'],
+          inputs=['adult.csv', 'generate_visualizations.py', 'models/dataset_summary.py',
+                  'models/dataset_store.py'],
+          outputs=['static/img'],
+          after=['dataset'],
+          description="Drawing the analysis charts",
+          on_failure="Chart generation failed; the analysis page will be missing images."),
+]
+
 
 def print_colored(text, color="green"):
     """Print colored text for better visibility"""
@@ -17,8 +86,8 @@ def print_colored(text, color="green"):
 def run_command(command):
     """Run a command and return output and status"""
     try:
-        print_colored(f"Running: {command}", "blue")
-        process = subprocess.run(command, shell=True, check=True, 
+        print_colored(f"Running: {subprocess.list2cmdline(command)}", "blue")
+        process = subprocess.run(command, check=True, 
                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                                 text=True)
         return True, process.stdout
@@ -27,26 +96,123 @@ def run_command(command):
         print_colored(f"Error output: {e.stderr}", "red")
         return False, e.stderr
 
+def path_files(path):
+    """The files under a path: itself if it is a file, its whole tree if it is a directory"""
+    if os.path.isdir(path):
+        return sorted(f for f in glob.glob(os.path.join(path, '**', '*'), recursive=True)
+                      if os.path.isfile(f))
+    return [path] if os.path.isfile(path) else []
+
+def paths_digest(paths):
+    """One sha256 over the names and contents of every file under the given paths.
+
+    A missing path hashes differently from any content, so creating it changes the digest.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        files = path_files(path)
+        if not files:
+            digest.update(f"{path}\0missing\0".encode())
+        for f in files:
+            digest.update(f"{f.replace(os.sep, '/')}\0{file_sha256(f)}\0".encode())
+    return digest.hexdigest()
+
+def stage_key(stage, upstream):
+    """Hash of everything a stage's result depends on"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([stage.command, [upstream[name] for name in stage.after]]).encode())
+    digest.update(paths_digest(stage.inputs).encode())
+    return digest.hexdigest()
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    with open(MANIFEST_PATH + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(MANIFEST_PATH + '.tmp', MANIFEST_PATH)
+
+def run_pipeline(stages, force=(), workers=None):
+    """Run the stages in dependency order, skipping those whose inputs are unchanged.
+
+    Stages whose dependencies are done run in parallel. A failed stage is left out
+    of the manifest so it runs again next time; the stages after it still run, as
+    the app can work without some of their outputs. Returns the names of the
+    stages that failed.
+    """
+    manifest = load_manifest()
+    # Output digest of each finished stage, part of the key of the stages after it
+    upstream = {}
+    pending = {stage.name: stage for stage in stages}
+    # Future of each running stage -> (stage, key)
+    running = {}
+    failed = []
+
+    def finish(stage, key, success, output):
+        if success:
+            upstream[stage.name] = paths_digest(stage.outputs) if stage.outputs else key
+            manifest[stage.name] = {'key': key, 'outputs': upstream[stage.name],
+                                    'finished_at': time.time()}
+            save_manifest(manifest)
+            print_colored(f"[{stage.name}] done", "green")
+        else:
+            upstream[stage.name] = None
+            manifest.pop(stage.name, None)
+            save_manifest(manifest)
+            failed.append(stage.name)
+            print_colored(f"[{stage.name}] {stage.on_failure or 'failed'}", "yellow")
+
+    with ThreadPoolExecutor(workers or len(stages)) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if any(dep not in upstream for dep in stage.after):
+                    continue
+                del pending[name]
+                key = stage_key(stage, upstream)
+                previous = manifest.get(name, {})
+                if (name not in force and 'all' not in force and previous.get('key') == key
+                        and all(os.path.exists(path) for path in stage.outputs)):
+                    upstream[name] = previous['outputs']
+                    print_colored(f"[{name}] unchanged, skipped", "blue")
+                    continue
+                print_colored(f"[{name}] {stage.description}...", "yellow")
+                running[pool.submit(run_command, stage.command)] = (stage, key)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, key = running.pop(future)
+                finish(stage, key, *future.result())
+    return failed
+
 def main():
     """Main function to set up and run the income prediction app"""
+    parser = argparse.ArgumentParser(description="Build what has changed and start the income prediction app")
+    parser.add_argument('--force', nargs='*', metavar='STAGE',
+                        help="Rerun these stages (or all of them, with no names) even if unchanged")
+    parser.add_argument('--no-serve', action='store_true', help="Only build; don't start the server")
+    args = parser.parse_args()
+    force = [] if args.force is None else args.force or ['all']
+    unknown = [name for name in force if name != 'all' and name not in {s.name for s in STAGES}]
+    if unknown:
+        parser.error(f"Unknown stage(s): {', '.join(unknown)}; choose from "
+                     f"{', '.join(s.name for s in STAGES)}")
+
     print_colored("Income Prediction App Setup", "green")
     print_colored("=========================", "green")
     print()
 
-    # Install required packages
-    print_colored("Installing required packages...", "yellow")
-    success, output = run_command(f"{sys.executable} -m pip install -r requirements.txt")
-    if not success:
-        print_colored("Failed to install packages. Continuing anyway...", "yellow")
-    
-    # Train the model
-    print_colored("Training the income prediction model...", "yellow")
-    success, output = run_command(f"{sys.executable} train_model.py")
-    if not success:
-        print_colored("Model training failed, but we'll continue with simulated predictions.", "yellow")
-    else:
-        print_colored("Model training complete!", "green")
-    
+    start = time.perf_counter()
+    run_pipeline(STAGES, force)
+    print_colored(f"Build finished in {time.perf_counter() - start:.1f}s", "green")
+    if args.no_serve:
+        return
+
     # Start the Flask app
     print_colored("Starting the Flask application...", "yellow")
     print_colored("Once started, open your browser and go to: http://127.0.0.1:5000", "blue")
@@ -55,7 +221,7 @@ def main():
     
     # Use subprocess.Popen to run Flask app without waiting for completion
     try:
-        flask_process = subprocess.Popen([sys.executable, "app.py"], 
+        flask_process = subprocess.Popen([sys.executable, "serve.py"], 
                                         stdout=subprocess.PIPE, 
                                         stderr=subprocess.PIPE,
                                         text=True)
@@ -0,0 +1,46 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+from models.forest_export import ArrayForest, export_forest
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    X, y = make_classification(n_samples=500, n_features=8, n_informative=5, random_state=0)
+    model = RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0).fit(X, y)
+    return model, X
+
+
+def test_predict_proba_matches_sklearn(fitted, tmp_path):
+    model, X = fitted
+    export_forest(model, str(tmp_path))
+    forest = ArrayForest(str(tmp_path))
+    assert np.array_equal(forest.predict_proba(X), model.predict_proba(X))
+    assert np.array_equal(forest.predict(X), model.predict(X))
+
+
+def test_contributions_add_up(fitted, tmp_path):
+    model, X = fitted
+    export_forest(model, str(tmp_path))
+    base_value, contributions = ArrayForest(str(tmp_path)).contributions(X)
+    assert np.allclose(base_value + contributions.sum(axis=1), model.predict_proba(X)[:, -1])
+
+
+def test_reexport_swaps_versions(fitted, tmp_path):
+    model, X = fitted
+    export_forest(model, str(tmp_path), n_trees=5)
+    first = ArrayForest(str(tmp_path))
+    export_forest(model, str(tmp_path))
+    export_forest(model, str(tmp_path))
+    with open(tmp_path / 'meta.json') as f:
+        meta = json.load(f)
+    # The current and the previous version are kept, older ones removed
+    versions = sorted(entry for entry in os.listdir(tmp_path) if entry.startswith('v'))
+    assert len(versions) == 2 and meta['arrays'] in versions
+    assert first.array_dir not in [str(tmp_path / v) for v in versions]
+    assert np.array_equal(ArrayForest(str(tmp_path)).predict_proba(X), model.predict_proba(X))
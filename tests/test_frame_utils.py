@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.frame_utils import FramePreprocessor
+
+EDUCATION = {'HS-grad': 9, 'Bachelors': 13, 'Masters': 14, 'Doctorate': 16}
+WORKCLASS = {'Private': 0, 'Self-emp': 1, 'State-gov': 2}
+
+
+def stub_preprocess(record):
+    """Stands in for preprocess_data: scales age, tabulates the text columns and
+    rejects unknown workclasses; missing values get codes of their own"""
+    if record['workclass'] not in WORKCLASS:
+        raise ValueError(f"Unknown workclass: {record['workclass']!r}")
+    age = record['age']
+    education = record['education']
+    return pd.DataFrame([{
+        'age': 0.0 if pd.isna(age) else (age - 38.5) / 13.6,
+        'education': -1 if pd.isna(education) else EDUCATION[education],
+        'workclass': WORKCLASS[record['workclass']],
+        'hours-per-week': record['hours-per-week'],
+    }])
+
+
+def make_frame(n, seed, workclasses=tuple(WORKCLASS)):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'age': rng.integers(17, 90, n).astype(np.float64),
+        'education': rng.choice(list(EDUCATION), n).astype(object),
+        'workclass': rng.choice(list(workclasses), n).astype(object),
+        'hours-per-week': rng.integers(1, 99, n),
+    })
+    df.loc[rng.random(n) < 0.1, 'age'] = np.nan
+    df.loc[rng.random(n) < 0.1, 'education'] = np.nan
+    return df
+
+
+def row_path(df):
+    return pd.concat([stub_preprocess(record) for record in df.to_dict('records')],
+                     ignore_index=True).set_axis(df.index)
+
+
+def test_matches_row_path():
+    preprocessor = FramePreprocessor(preprocess=stub_preprocess)
+    for seed in range(3):
+        df = make_frame(300, seed)
+        pd.testing.assert_frame_equal(preprocessor.transform(df), row_path(df),
+                                      check_exact=False, rtol=1e-12)
+    assert preprocessor.compiled
+    # age is computed from its affine map, the text columns from lookup tables
+    assert 'age' in preprocessor._affine
+    assert {'education', 'workclass'} <= set(preprocessor._maps)
+
+
+def test_invalid_rows():
+    df = make_frame(200, 3, workclasses=list(WORKCLASS) + ['Bogus'])
+    # The leading row is rejected, so the probes need another base record
+    df.loc[0, 'workclass'] = 'Bogus'
+    preprocessor = FramePreprocessor(preprocess=stub_preprocess)
+    out, invalid = preprocessor.transform(df, return_invalid=True)
+    assert np.array_equal(invalid, (df['workclass'] == 'Bogus').to_numpy())
+    valid = df[~invalid]
+    pd.testing.assert_frame_equal(out[~invalid], row_path(valid),
+                                  check_exact=False, rtol=1e-12)
+    with pytest.raises(ValueError, match='Bogus'):
+        preprocessor.transform(df)
+
+
+def test_missing_values_use_row_path():
+    df = make_frame(50, 4)
+    df.loc[:, 'age'] = np.nan
+    df.loc[::2, 'education'] = np.nan
+    preprocessor = FramePreprocessor(preprocess=stub_preprocess)
+    out = preprocessor.transform(df)
+    assert (out['age'] == 0.0).all()
+    assert (out.loc[::2, 'education'] == -1).all()
+    pd.testing.assert_frame_equal(out, row_path(df), check_exact=False, rtol=1e-12)
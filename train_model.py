@@ -1,14 +1,94 @@
 import pandas as pd
 import numpy as np
 import os
+import json
+import time
+import argparse
+import tempfile
 import joblib
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split, GridSearchCV
 from sklearn.metrics import accuracy_score, classification_report
-from models.model_utils import train_preprocessors, preprocess_data, FEATURE_ORDER
+from models.model_utils import train_preprocessors, FEATURE_ORDER
+from models.frame_utils import FramePreprocessor
+from models.rules import override_rules
+from models.forest_export import export_forest, ArrayForest
+from models.registry import file_sha256
+from models.model_search import successive_halving_search, grid_search_report
+from models.dataset_store import load_dataset
+from models.drift import build_reference, extend_reference, load_reference, save_reference
+from models.compression import compress_model, print_report, COMPACT_DIR, DEFAULT_TOLERANCE
+from models.calibration import (fit_calibration, save_calibration, CalibrationTable,
+                                CALIBRATION_PATH, DEFAULT_SEGMENT_COLUMN)
+from models.incremental import (CategoryExtensions, record_ingest, load_ingest_state,
+                                read_appended_rows)
 
-def main():
+MODEL_PATH = 'models/income_predictor.pkl'
+FOREST_DIR = 'models/income_predictor_forest'
+DATASET_PATH = 'adult.csv'
+
+def prepare_columns(df):
+    """Split a raw dataset frame into FEATURE_ORDER features and a binary target"""
+    # Ensure all required columns are present
+    for col in FEATURE_ORDER:
+        if col not in df.columns and col != 'income':
+            print(f"Missing required column: {col}")
+            print("Available columns:", df.columns.tolist())
+            print("Creating column with default values")
+            df[col] = 0
+    
+    # Separate features and target
+    X = df[FEATURE_ORDER].copy()  # Use only the columns in the specified order
+    y = (df['income'] == '>50K').astype(int)  # Convert to binary target
+    return X, y
+
+def check_export(model, X_check):
+    """Stop training if the array export of model would not reproduce it on X_check.
+
+    The export is checked in a scratch directory before anything the app reads is
+    replaced, so a mismatch leaves the previous model and its files in place.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        export_forest(model, scratch)
+        array_forest = ArrayForest(scratch)
+        expected = model.predict_proba(X_check)
+        matches = np.array_equal(array_forest.predict_proba(X_check), expected)
+        base_value, contributions = array_forest.contributions(X_check)
+        explained = np.allclose(base_value + contributions.sum(axis=1), expected[:, -1])
+        # Release the memory-mapped files before the directory is removed
+        del array_forest
+    if not matches:
+        raise SystemExit("The array export DOES NOT match sklearn on the check data; "
+                         "nothing was saved")
+    if not explained:
+        raise SystemExit("Explanations DO NOT add up to the model's probabilities; "
+                         "nothing was saved")
+    print("The array export matches sklearn on the check data and its explanations add up")
+
+def save_model(model):
+    """Save the model and its array export; run check_export first"""
+    print(f"\nSaving model to {MODEL_PATH}...")
+    # Write to a temp file and rename so a running app never reads a half-written model
+    tmp_path = MODEL_PATH + '.tmp'
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, MODEL_PATH)
+    
+    # Also export the forest as flat arrays that the app can memory-map
+    print(f"Exporting forest arrays to {FOREST_DIR}...")
+    forest_meta = export_forest(model, FOREST_DIR, source_sha256=file_sha256(MODEL_PATH))
+    print(f"Exported {forest_meta['n_trees']} trees ({forest_meta['n_nodes']} nodes), "
+          f"loads in {ArrayForest(FOREST_DIR).load_seconds * 1000:.1f}ms")
+
+def end_phase(phase_seconds, name, start):
+    """Record the time since start as phase name and return the current time"""
+    now = time.perf_counter()
+    phase_seconds[name] = round(now - start, 3)
+    return now
+
+def main(search='halving', segment_column=DEFAULT_SEGMENT_COLUMN, compress_tolerance=DEFAULT_TOLERANCE):
     print("Starting income prediction model training...")
+    phase_seconds = {}
+    phase_start = time.perf_counter()
     
     # Create models directory if it doesn't exist
     if not os.path.exists('models'):
@@ -17,49 +97,40 @@ def main():
     
     # Load dataset
     try:
-        df = pd.read_csv('adult.csv')
+        # Plain dtypes, as the preprocessors and FramePreprocessor were written for
+        df, dataset_meta = load_dataset(DATASET_PATH, as_category=False, return_meta=True)
         print(f"Dataset loaded with {len(df)} records")
     except Exception as e:
         print(f"Error loading dataset: {str(e)}")
         return
+    phase_start = end_phase(phase_seconds, 'load', phase_start)
     
     # Prepare data
     print("Preparing data...")
-    # Ensure all required columns are present
-    for col in FEATURE_ORDER:
-        if col not in df.columns and col != 'income':
-            print(f"Missing required column: {col}")
-            print("Available columns:", df.columns.tolist())
-            print("Creating column with default values")
-            df[col] = 0
-    
-    # Separate features and target
-    X = df[FEATURE_ORDER].copy()  # Use only the columns in the specified order
-    y = (df['income'] == '>50K').astype(int)  # Convert to binary target
+    X, y = prepare_columns(df)
     
     # Split data
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     print(f"Data split: {len(X_train)} training samples, {len(X_test)} testing samples")
+    phase_start = end_phase(phase_seconds, 'prepare', phase_start)
     
     # Train preprocessors
     print("Training preprocessors...")
     train_preprocessors(X_train)
+    phase_start = end_phase(phase_seconds, 'fit_preprocessors', phase_start)
     
-    # Preprocess training data
+    # Preprocess whole columns at once with the preprocessors fitted above
+    frame_preprocessor = FramePreprocessor()
     print("Preprocessing training data...")
-    processed_rows = []
-    for i, row in X_train.iterrows():
-        processed_row = preprocess_data(row.to_dict())
-        processed_rows.append(processed_row.iloc[0])
-    X_train_processed = pd.DataFrame(processed_rows)
+    X_train_processed = frame_preprocessor.transform(X_train)
     
     # Preprocess test data
     print("Preprocessing test data...")
-    processed_test_rows = []
-    for i, row in X_test.iterrows():
-        processed_row = preprocess_data(row.to_dict())
-        processed_test_rows.append(processed_row.iloc[0])
-    X_test_processed = pd.DataFrame(processed_test_rows)
+    X_test_processed = frame_preprocessor.transform(X_test)
+    
+    # Freshly fitted encoders start with no extension codes
+    category_extensions = CategoryExtensions.from_training(X_train, X_train_processed)
+    phase_start = end_phase(phase_seconds, 'preprocess', phase_start)
     
     # Create sample inputs for validation
     young_service_profile = {
@@ -105,24 +176,79 @@ def main():
         'min_samples_leaf': [1, 2]
     }
     
-    # Use GridSearchCV for hyperparameter tuning
-    rf = RandomForestClassifier(random_state=42)
-    grid_search = GridSearchCV(estimator=rf, param_grid=param_grid, 
-                              cv=3, n_jobs=-1, verbose=1)
-    grid_search.fit(X_train_processed, y_train)
+    search_start = time.perf_counter()
+    if search == 'grid':
+        # Use GridSearchCV for hyperparameter tuning
+        rf = RandomForestClassifier(random_state=42, oob_score=True)
+        grid_search = GridSearchCV(estimator=rf, param_grid=param_grid, 
+                                  cv=3, n_jobs=-1, verbose=1)
+        grid_search.fit(X_train_processed, y_train)
+        training_report = grid_search_report(grid_search, time.perf_counter() - search_start)
+        
+        # Get best model
+        best_model = grid_search.best_estimator_
+        print(f"Best parameters: {grid_search.best_params_}")
+    else:
+        # Successive halving: every candidate starts small and only the best get more trees
+        halving_grid = {k: v for k, v in param_grid.items() if k != 'n_estimators'}
+        best_params, best_n_estimators, training_report = successive_halving_search(
+            X_train_processed, y_train, halving_grid,
+            min_trees=25, max_trees=max(param_grid['n_estimators']))
+        
+        # Refit the winner on the whole training set
+        refit_start = time.perf_counter()
+        best_model = RandomForestClassifier(random_state=42, n_estimators=best_n_estimators,
+                                            oob_score=True, **best_params)
+        best_model.fit(X_train_processed, y_train)
+        training_report['refit_seconds'] = round(time.perf_counter() - refit_start, 3)
+        print(f"Best parameters: {dict(best_params, n_estimators=best_n_estimators)}")
+    training_report['total_seconds'] = round(time.perf_counter() - search_start, 3)
+    print(f"Search took {training_report['total_seconds']:.1f}s "
+          f"({training_report['total_tree_fits']} tree fits)")
+    phase_start = end_phase(phase_seconds, 'search', phase_start)
     
-    # Get best model
-    best_model = grid_search.best_estimator_
-    print(f"Best parameters: {grid_search.best_params_}")
+    # Calibrate on out-of-bag probabilities: every training row scored only by trees
+    # that didn't see it, so no data has to be held back from the forest
+    print(f"\nFitting probability calibration with thresholds per {segment_column}...")
+    positive = list(best_model.classes_).index(1)
+    oob_probabilities = best_model.oob_decision_function_[:, positive]
+    scored = ~np.isnan(oob_probabilities)
+    calibration = fit_calibration(oob_probabilities[scored], y_train.to_numpy()[scored],
+                                  X_train[segment_column].to_numpy()[scored], segment_column)
+    # The per-row OOB scores aren't needed when serving
+    del best_model.oob_decision_function_
+    calibration_table = CalibrationTable(calibration)
+    raw_test = best_model.predict_proba(X_test_processed)[:, positive]
+    brier_raw = float(np.mean((raw_test - y_test.to_numpy()) ** 2))
+    brier_calibrated = float(np.mean((calibration_table.calibrate(raw_test) - y_test.to_numpy()) ** 2))
+    print(f"{len(calibration['x'])} isotonic breakpoints; test Brier score "
+          f"{brier_raw:.4f} raw, {brier_calibrated:.4f} calibrated")
+    for name, threshold in zip(calibration['segment_names'], calibration['segment_thresholds']):
+        print(f"  {segment_column}={name}: threshold {threshold:.3f}")
+    training_report['calibration'] = {
+        'breakpoints': len(calibration['x']),
+        'segment_column': segment_column,
+        'thresholds': {str(name): round(float(threshold), 5) for name, threshold
+                       in zip(calibration['segment_names'], calibration['segment_thresholds'])},
+        'default_threshold': round(float(calibration['default_threshold']), 5),
+        'test_brier_raw': round(brier_raw, 5),
+        'test_brier_calibrated': round(brier_calibrated, 5),
+    }
+    phase_start = end_phase(phase_seconds, 'calibrate', phase_start)
     
     # Evaluate on test data
     print("\nEvaluating model on test data...")
     y_test_pred = best_model.predict(X_test_processed)
     test_accuracy = accuracy_score(y_test, y_test_pred)
     print(f"Test accuracy: {test_accuracy:.4f}")
+    training_report['test_accuracy'] = round(test_accuracy, 5)
     print("\nClassification Report:")
     print(classification_report(y_test, y_test_pred))
     
+    # The app applies the override rules on top of the model, so report that too
+    y_test_served, _ = override_rules.apply(X_test, y_test_pred)
+    print(f"Test accuracy with rule overrides: {accuracy_score(y_test, y_test_served):.4f}")
+    
     # Validate with sample profiles
     print("\nValidating with sample profiles...")
     sample_profiles = [
@@ -130,22 +256,53 @@ def main():
         ("Executive with higher education", executive_profile, ">50K")
     ]
     
-    for profile_name, profile, expected in sample_profiles:
-        profile_processed = preprocess_data(profile)
-        prediction = best_model.predict(profile_processed)[0]
+    profiles = pd.DataFrame([profile for _, profile, _ in sample_profiles])[FEATURE_ORDER]
+    profile_predictions, profile_rules = override_rules.apply(
+        profiles, best_model.predict(frame_preprocessor.transform(profiles)))
+    
+    for (profile_name, profile, expected), prediction, rule in zip(sample_profiles, profile_predictions, profile_rules):
         result = ">50K" if prediction == 1 else "<=50K"
         correct = result == expected
-        print(f"{profile_name}: Predicted {result}, Expected {expected}, {'✓ Correct' if correct else '✗ INCORRECT'}")
+        rule_note = f" (rule: {override_rules.rule_name(rule)})" if rule >= 0 else ""
+        print(f"{profile_name}: Predicted {result}, Expected {expected}, {'✓ Correct' if correct else '✗ INCORRECT'}{rule_note}")
         
         # If prediction is incorrect, adjust feature importances
         if not correct:
             print("  Adjusting model to improve prediction for this profile type...")
             # This is a simplified approach - in a real system, you would do more sophisticated recalibration
+    phase_start = end_phase(phase_seconds, 'evaluate', phase_start)
             
-    # Save model
-    model_path = 'models/income_predictor.pkl'
-    print(f"\nSaving model to {model_path}...")
-    joblib.dump(best_model, model_path)
+    # Save model; the extensions, calibration and drift reference go first so a
+    # reloading app never pairs them with the wrong model
+    check_export(best_model, X_test_processed)
+    category_extensions.save()
+    save_calibration(calibration)
+    save_reference(build_reference(X_train))
+    save_model(best_model)
+    
+    # Later incremental runs only read rows appended after the part loaded above
+    record_ingest(DATASET_PATH, len(df), dataset_meta['csv_size'])
+    phase_start = end_phase(phase_seconds, 'save', phase_start)
+    
+    # Smallest forest within the accuracy tolerance, for low-latency serving. The
+    # forest has seen every training row, so the choice is made on half of the test
+    # split and the variants are compared on the other half
+    print(f"\nCompressing the forest into {COMPACT_DIR}...")
+    X_val_processed, X_holdout_processed, y_val, y_holdout = train_test_split(
+        X_test_processed, y_test, test_size=0.5, random_state=42, stratify=y_test)
+    compression = compress_model(best_model, MODEL_PATH, FOREST_DIR, X_val_processed, y_val,
+                                 X_holdout_processed, y_holdout, compress_tolerance,
+                                 source_sha256=file_sha256(MODEL_PATH))
+    print_report(compression)
+    training_report['compression'] = compression
+    end_phase(phase_seconds, 'compress', phase_start)
+    training_report['phase_seconds'] = phase_seconds
+    
+    # Write the training report next to the model
+    report_path = 'models/training_report.json'
+    with open(report_path, 'w') as f:
+        json.dump(training_report, f, indent=2)
+    print(f"Training report written to {report_path}")
     
     print("Model training completed successfully!")
     print(f"Feature order used in training: {FEATURE_ORDER}")
@@ -160,5 +317,99 @@ def main():
         if feature_idx < len(FEATURE_ORDER):  # Check index is in range
             print(f"{FEATURE_ORDER[feature_idx]}: {importances[feature_idx]:.4f}")
 
+def incremental_main(replace=False):
+    """Update the saved model with rows appended to the dataset since it was trained.
+    
+    Only the new rows are read and preprocessed. Unseen categories get new codes from
+    the category extensions, and the forest is warm-started with extra trees fitted on
+    the new rows, in proportion to their share of all rows ingested so far. With
+    replace=True the same number of oldest trees is dropped, keeping the size fixed.
+    """
+    print("Starting incremental training...")
+    state = load_ingest_state()
+    category_extensions = CategoryExtensions.load()
+    if state is None or category_extensions is None or not os.path.exists(MODEL_PATH):
+        print("No previous training run recorded; run a full training first")
+        return
+    
+    try:
+        df, end = read_appended_rows(DATASET_PATH, state)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return
+    if len(df) == 0:
+        print(f"No new rows since the last training run ({state['rows']} rows ingested)")
+        return
+    print(f"Read {len(df)} new records appended after row {state['rows']}")
+    
+    X_new, y_new = prepare_columns(df)
+    if y_new.nunique() < 2:
+        print("New rows contain only one income class; waiting for more data")
+        return
+    
+    for col, value, code in category_extensions.extend(X_new):
+        print(f"New {col} category {value!r} encoded as {code}")
+    X_new_processed = FramePreprocessor(extensions=category_extensions).transform(X_new)
+    
+    model = joblib.load(MODEL_PATH)
+    accuracy_before = accuracy_score(y_new, model.predict(X_new_processed))
+    
+    # Give the new rows their share of the trees
+    n_trees = len(model.estimators_)
+    total_rows = state['rows'] + len(df)
+    n_new = max(1, round(n_trees * len(df) / total_rows))
+    if replace:
+        model.estimators_ = model.estimators_[n_new:]
+    fit_start = time.perf_counter()
+    # Out-of-bag scores of the old trees can't be computed from the new rows alone
+    model.set_params(warm_start=True, oob_score=False, n_estimators=len(model.estimators_) + n_new)
+    model.fit(X_new_processed, y_new)
+    model.set_params(warm_start=False)
+    for attribute in ('oob_score_', 'oob_decision_function_'):
+        if hasattr(model, attribute):
+            delattr(model, attribute)
+    fit_seconds = time.perf_counter() - fit_start
+    
+    accuracy_after = accuracy_score(y_new, model.predict(X_new_processed))
+    print(f"{'Replaced' if replace else 'Added'} {n_new} trees in {fit_seconds:.1f}s, "
+          f"forest now has {len(model.estimators_)} trees")
+    print(f"Accuracy on the new rows: {accuracy_before:.4f} before, {accuracy_after:.4f} after")
+    
+    # As in a full run, everything paired with the model is written before it.
+    # The calibration was fitted to the previous forest's out-of-bag probabilities,
+    # which the new rows can't reproduce, so it is removed rather than left stale;
+    # the drift reference gains the new rows.
+    check_export(model, X_new_processed)
+    category_extensions.save()
+    if os.path.exists(CALIBRATION_PATH):
+        os.remove(CALIBRATION_PATH)
+        print(f"Removed {CALIBRATION_PATH}, which was fitted to the previous model; "
+              "probabilities are served uncalibrated until a full training run")
+    reference = load_reference()
+    if reference is not None:
+        save_reference(extend_reference(reference, X_new))
+    save_model(model)
+    record_ingest(DATASET_PATH, total_rows, end)
+    if os.path.exists(COMPACT_DIR):
+        print(f"Note: the compact variant in {COMPACT_DIR} is still the previous model; "
+              "a full training run rebuilds it")
+    print("Incremental training completed successfully!")
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the income prediction model")
+    parser.add_argument('--search', choices=['halving', 'grid'], default='halving',
+                        help="Hyperparameter search: successive halving (default) or the full grid")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only train on rows appended to adult.csv since the last run")
+    parser.add_argument('--segment-column', default=DEFAULT_SEGMENT_COLUMN,
+                        help="Feature whose values get their own decision thresholds")
+    parser.add_argument('--replace', action='store_true',
+                        help="With --incremental, drop as many of the oldest trees as are added")
+    parser.add_argument('--compress-tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Validation accuracy the compact model variant may lose, "
+                             "at 95% confidence")
+    args = parser.parse_args()
+    if args.incremental:
+        incremental_main(args.replace)
+    else:
+        main(args.search, args.segment_column, args.compress_tolerance) 
\ No newline at end of file